@@ -22,7 +22,13 @@ async def get_user_from_token(
         username = auth_service.get_username_from_token(
             token=token,
             secret_key=str(SECRET_KEY))
-        user = await user_repo.get_user_by_username(username=username)
+        user = auth_service.user_cache.get(username)
+        if user is None:
+            # Profiles are only loaded by the routes that return them
+            user = await user_repo.get_user_by_username(username=username,
+                                                        populate=False)
+            if user:
+                auth_service.user_cache.put(username, user)
     except Exception as e:
         raise e
 
@@ -47,3 +53,14 @@ def get_current_active_user(
 
     return current_user
 
+
+def get_current_superuser(
+        current_user: UserInDB = Depends(get_current_active_user)
+        ) -> UserInDB:
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a superuser.",
+        )
+
+    return current_user
@@ -0,0 +1,28 @@
+from typing import List, Optional
+
+from fastapi import Header
+from fastapi.responses import Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+
+def get_if_none_match(if_none_match: Optional[str] = Header(None)) -> List[str]:
+    """The entity tags of an If-None-Match header, without W/ prefixes"""
+    if not if_none_match:
+        return []
+    tags = []
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+def etag_matches(if_none_match: List[str], etag: str) -> bool:
+    return '*' in if_none_match or etag in if_none_match
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': etag, 'Cache-Control': cache_control})
@@ -0,0 +1,111 @@
+import base64
+import binascii
+import hashlib
+from typing import AsyncIterator, NamedTuple, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+)
+
+from app.core.config import MODEL_MAX_BYTES
+
+
+RAW_CONTENT_TYPES = ('text/plain', 'application/octet-stream')
+CHUNK_SIZE = 64 * 1024
+
+
+class ModelUpload(NamedTuple):
+    data: bytes
+    hash: str
+
+    def text(self) -> str:
+        try:
+            return self.data.decode('utf8')
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Model must be UTF-8 text",
+            )
+
+
+def too_large(what: str = "Model", max_bytes: int = MODEL_MAX_BYTES) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"{what} exceeds {max_bytes} bytes",
+    )
+
+
+async def capped_stream(request: Request,
+                        max_bytes: int,
+                        what: str = "Model") -> AsyncIterator[bytes]:
+    """The request body in chunks, failing with 413 past max_bytes"""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() \
+            and int(content_length) > max_bytes:
+        raise too_large(what, max_bytes)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large(what, max_bytes)
+        yield chunk
+
+
+class _Reader:
+    """Collects chunks, hashing them and enforcing MODEL_MAX_BYTES"""
+
+    def __init__(self) -> None:
+        self.chunks = []
+        self.size = 0
+        self.sha = hashlib.sha256()
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > MODEL_MAX_BYTES:
+            raise too_large()
+        self.sha.update(chunk)
+        self.chunks.append(chunk)
+
+    def result(self) -> ModelUpload:
+        return ModelUpload(b''.join(self.chunks), self.sha.hexdigest())
+
+
+async def read_upload(model_file: UploadFile) -> ModelUpload:
+    reader = _Reader()
+    while True:
+        chunk = await model_file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        reader.feed(chunk)
+    return reader.result()
+
+
+async def get_model_body(request: Request, fenc: Optional[str] = None) -> ModelUpload:
+    """
+    The model sent as the raw request body (text/plain or
+    application/octet-stream), streamed in chunks. The base64 ``fenc``
+    query parameter is still accepted for older clients.
+    """
+    reader = _Reader()
+    if fenc:
+        try:
+            reader.feed(base64.b64decode(fenc))
+        except binascii.Error:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="fenc is not valid base64",
+            )
+        return reader.result()
+
+    content_type = request.headers.get('content-type', 'application/octet-stream')
+    if content_type.split(';')[0].strip() not in RAW_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Send the model as {' or '.join(RAW_CONTENT_TYPES)}",
+        )
+    async for chunk in capped_stream(request, MODEL_MAX_BYTES):
+        reader.feed(chunk)
+    return reader.result()
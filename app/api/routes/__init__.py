@@ -1,9 +1,15 @@
 from fastapi import APIRouter
 from app.api.routes.user import router as user_router
 from app.api.routes.dflow import router as dflow_router
+from app.api.routes.codegen_jobs import router as codegen_jobs_router
+from app.api.routes.metrics import router as metrics_router
+from app.api.routes.profiles import router as profiles_router
 
 
 router = APIRouter()
 
 router.include_router(user_router, tags=["user"])
 router.include_router(dflow_router, tags=["dsl"])
+router.include_router(codegen_jobs_router, tags=["dsl"])
+router.include_router(metrics_router, tags=["metrics"])
+router.include_router(profiles_router, tags=["profiler"])
@@ -0,0 +1,115 @@
+from typing import List
+
+from databases import Database
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    UploadFile,
+)
+from fastapi.responses import FileResponse
+from starlette.status import (
+    HTTP_200_OK,
+    HTTP_202_ACCEPTED,
+    HTTP_404_NOT_FOUND,
+    HTTP_409_CONFLICT,
+    HTTP_410_GONE,
+)
+
+from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.conditional import etag_matches, get_if_none_match, not_modified
+from app.api.dependencies.database import get_database, get_repository
+from app.api.dependencies.upload import read_upload
+from app.db.repositories.job import CodegenJobRepository
+from app.models.job import (
+    CodegenJobCreate,
+    CodegenJobInDB,
+    CodegenJobPublic,
+    CodegenJobStatus,
+)
+from app.models.user import UserInDB
+from app.services import codegen_job_runner, dflow_service
+
+
+router = APIRouter()
+
+
+async def get_job_for_user(job_id: int,
+                           job_repo: CodegenJobRepository,
+                           user: UserInDB) -> CodegenJobInDB:
+    job = await job_repo.get_job_by_id(job_id=job_id)
+    if not job or job.user_id != user.id:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Codegen job does not exist",
+        )
+    return job
+
+
+@router.post("/codegen/jobs",
+             response_model=CodegenJobPublic,
+             name="codegen:create_job",
+             status_code=HTTP_202_ACCEPTED
+             )
+async def create_codegen_job(
+    model_file: UploadFile = File(...),
+    db: Database = Depends(get_database),
+    job_repo: CodegenJobRepository = Depends(get_repository(CodegenJobRepository)),
+    current_user: UserInDB = Depends(get_current_active_user)
+    ) -> CodegenJobPublic:
+    codegen_job_runner.check_capacity()
+    model = await read_upload(model_file)
+    job = await job_repo.create_job(
+        job_create=CodegenJobCreate(user_id=current_user.id))
+    codegen_job_runner.submit(db, job.id, model.data)
+    return CodegenJobPublic(**job.dict())
+
+
+@router.get("/codegen/jobs/{job_id}",
+            response_model=CodegenJobPublic,
+            name="codegen:get_job",
+            status_code=HTTP_200_OK
+            )
+async def get_codegen_job(
+    job_id: int,
+    job_repo: CodegenJobRepository = Depends(get_repository(CodegenJobRepository)),
+    current_user: UserInDB = Depends(get_current_active_user)
+    ) -> CodegenJobPublic:
+    job = await get_job_for_user(job_id, job_repo, current_user)
+    return CodegenJobPublic(**job.dict())
+
+
+@router.get("/codegen/jobs/{job_id}/artifact",
+            response_class=FileResponse,
+            name="codegen:get_job_artifact",
+            status_code=HTTP_200_OK
+            )
+async def get_codegen_job_artifact(
+    job_id: int,
+    if_none_match: List[str] = Depends(get_if_none_match),
+    job_repo: CodegenJobRepository = Depends(get_repository(CodegenJobRepository)),
+    current_user: UserInDB = Depends(get_current_active_user)
+    ) -> FileResponse:
+    job = await get_job_for_user(job_id, job_repo, current_user)
+    if job.status != CodegenJobStatus.done:
+        raise HTTPException(
+            status_code=HTTP_409_CONFLICT,
+            detail=f"Codegen job is {job.status.value}",
+        )
+    # Artifacts are addressed by the content of the model and built
+    # reproducibly, so a given key always names the same bytes
+    etag = f'"{job.artifact_key}"'
+    cache_control = 'private, max-age=31536000, immutable'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, cache_control)
+    tarball_path = dflow_service.artifacts.get(job.artifact_key)
+    if tarball_path is None:
+        raise HTTPException(
+            status_code=HTTP_410_GONE,
+            detail="Codegen artifact has expired. Please submit a new job.",
+        )
+    return FileResponse(tarball_path,
+                        filename=f'codegen-job-{job.id}.tar.gz',
+                        media_type='application/x-tar',
+                        headers={'ETag': etag, 'Cache-Control': cache_control})
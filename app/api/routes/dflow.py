@@ -1,14 +1,19 @@
-import base64
+import json
 import os
-from typing import Optional, Dict
+import time
+from typing import Optional, Dict, List, Tuple
 
 from app.api.dependencies.auth import get_current_active_user
+from app.api.dependencies.upload import ModelUpload, capped_stream, get_model_body, read_upload
+from app.api.dependencies.conditional import etag_matches, get_if_none_match, not_modified
+from app.core.config import CODEGEN_STREAMING, VALIDATION_BATCH_MAX_BYTES, VALIDATION_BATCH_MAX_MODELS
 from app.api.dependencies.database import get_repository
-from app.db.repositories.dmodel import DModelRepository
-from app.db.repositories.user import UserRepository
+from app.db.repositories.dmodel import DModelRepository, decode_cursor, encode_cursor
+from app.db.repositories.merged import MergedModelRepository
 
 from app.models.user import UserInDB
-from app.models.dmodel import DModelInsert, DModelInDB, DModelPublic
+from app.models.dmodel import DModelInsert, DModelInDB, DModelMeta, DModelPage, DModelPublic
+from app.models.validation import ValidationBatch, ValidationBatchResult
 
 
 from app.services import dflow_service
@@ -20,9 +25,12 @@ from fastapi import (
     File,
     HTTPException,
     Path,
+    Query,
+    Request,
     UploadFile,
     status
 )
+from pydantic import ValidationError
 from starlette.status import (
     HTTP_200_OK,
     HTTP_201_CREATED,
@@ -31,12 +39,105 @@ from starlette.status import (
     HTTP_404_NOT_FOUND,
     HTTP_422_UNPROCESSABLE_ENTITY
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import (
+    FileResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse
+)
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartParser
 
 
 router = APIRouter()
 
 
+async def read_validation_batch(request: Request) -> List[Tuple[str, bytes]]:
+    content_type = request.headers.get('content-type', '')
+    body = capped_stream(request, VALIDATION_BATCH_MAX_BYTES, "Batch")
+    if content_type.startswith('multipart/form-data'):
+        form = await MultiPartParser(request.headers, body).parse()
+        try:
+            models = []
+            for f in form.getlist('model_files'):
+                if not isinstance(f, StarletteUploadFile):
+                    raise HTTPException(
+                        status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="Invalid batch: model_files must be files",
+                    )
+                models.append((f.filename, (await read_upload(f)).data))
+        finally:
+            await form.close()
+    else:
+        try:
+            batch = ValidationBatch(**json.loads(b''.join([c async for c in body])))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise HTTPException(
+                status_code=HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid batch: {str(e)}",
+            )
+        models = [(m.name, m.raw.encode('utf8')) for m in batch.models]
+    if not models:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail="No models to validate",
+        )
+    if len(models) > VALIDATION_BATCH_MAX_MODELS:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"At most {VALIDATION_BATCH_MAX_MODELS} models per batch",
+        )
+    return models
+
+
+# Authenticated content that clients may keep, but must revalidate: the
+# "last model" routes change whenever a user stores a new version.
+MODEL_CACHE_CONTROL = 'private, no-cache'
+
+
+def model_etag(dmodel: DModelMeta) -> str:
+    """Strong ETag of a stored model version, from its id, time and content"""
+    version = f"{dmodel.id}-{int(dmodel.updated_at.timestamp() * 1000000):x}"
+    if dmodel.content_hash:
+        version = f"{version}-{dmodel.content_hash[0:16]}"
+    return f'"{version}"'
+
+
+def model_not_modified(if_none_match: List[str],
+                       dmodel: Optional[DModelMeta]) -> Optional[Response]:
+    if dmodel is None:
+        return None
+    etag = model_etag(dmodel)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, MODEL_CACHE_CONTROL)
+    return None
+
+
+def model_cache_headers(dmodel: DModelMeta) -> Dict[str, str]:
+    return {'ETag': model_etag(dmodel), 'Cache-Control': MODEL_CACHE_CONTROL}
+
+
+def model_file_response(dmodel: DModelMeta, raw: str) -> Response:
+    headers = model_cache_headers(dmodel)
+    headers['Content-Disposition'] = \
+        f'attachment; filename="dmodel-{dmodel.id}.dflow"'
+    return Response(raw.encode('utf8'), media_type='text/plain', headers=headers)
+
+
+def release_scratch(path: str) -> BackgroundTask:
+    return BackgroundTask(dflow_service.scratch.release, path)
+
+
+async def stream_codegen(model: bytes) -> StreamingResponse:
+    chunks, filename = await dflow_service.codegen_stream(model)
+    return StreamingResponse(
+        chunks,
+        media_type='application/x-tar',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
 @router.post("/validation/file",
              response_model=Dict,
              name="validation:validate_mode_file",
@@ -52,9 +153,11 @@ async def validate_model_file(
         'status': 200,
         'message': ''
     }
-    fd = model_file.file
+    model = await read_upload(model_file)
     try:
-        dflow_service.validate_model(fd)
+        await dflow_service.validate(model.data)
+    except HTTPException:
+        raise
     except Exception as e:
         resp['status'] = 404
         resp['message'] = str(e)
@@ -67,16 +170,17 @@ async def validate_model_file(
              status_code=HTTP_200_OK
              )
 async def validate_model_b64(
-    fenc: str = '',
-    current_user: UserInDB = Depends(get_current_active_user)
+    current_user: UserInDB = Depends(get_current_active_user),
+    model: ModelUpload = Depends(get_model_body)
     ):
     resp = {
         'status': 200,
         'message': ''
     }
-    fdec = base64.b64decode(fenc)
     try:
-        dflow_service.validate_model_b64(fdec)
+        await dflow_service.validate(model.data)
+    except HTTPException:
+        raise
     except Exception as e:
         resp['status'] = 404
         resp['message'] = str(e)
@@ -84,6 +188,37 @@ async def validate_model_b64(
     return resp
 
 
+@router.post("/validation/batch",
+             response_model=ValidationBatchResult,
+             name="validation:validate_batch",
+             status_code=HTTP_200_OK
+             )
+async def validate_batch(
+    request: Request,
+    stream: bool = False,
+    current_user: UserInDB = Depends(get_current_active_user)
+    ):
+    """
+    Validate many models in one call. Send them either as multipart files
+    (field ``model_files``) or as JSON ``{"models": [{"name", "raw"}]}``.
+    With ``stream=true`` results are sent as NDJSON, one line per model
+    as soon as it is validated.
+    """
+    t0 = time.perf_counter()
+    models = await read_validation_batch(request)
+    results = dflow_service.validate_batch(models)
+    if stream:
+        return StreamingResponse(
+            (json.dumps(r) + '\n' async for r in results),
+            media_type='application/x-ndjson'
+        )
+    collected = sorted([r async for r in results], key=lambda r: r['index'])
+    return ValidationBatchResult(
+        results=collected,
+        elapsed_ms=(time.perf_counter() - t0) * 1000
+    )
+
+
 @router.post("/codegen/file",
              response_class=FileResponse,
              name="codegen:gen_from_file",
@@ -91,15 +226,27 @@ async def validate_model_b64(
              )
 async def gen_from_file(
     model_file: UploadFile = File(...),
+    stream: bool = CODEGEN_STREAMING,
     current_user: UserInDB = Depends(get_current_active_user)
     ):
     print(f'Generate for request: file=<{model_file.filename}>,' + \
           f' descriptor=<{model_file.file}>')
-    fd = model_file.file
-    tarball_path = dflow_service.generate(fd)
+    model = await read_upload(model_file)
+    try:
+        if stream:
+            return await stream_codegen(model.data)
+        tarball_path = await dflow_service.codegen(model.data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"{str(e)}",
+        )
     return FileResponse(tarball_path,
                         filename=os.path.basename(tarball_path),
-                        media_type='application/x-tar')
+                        media_type='application/x-tar',
+                        background=release_scratch(tarball_path))
 
 
 @router.post("/codegen/b64",
@@ -108,12 +255,16 @@ async def gen_from_file(
              status_code=HTTP_200_OK
              )
 async def gen_model_b64(
-    fenc: str = '',
-    current_user: UserInDB = Depends(get_current_active_user)
+    stream: bool = CODEGEN_STREAMING,
+    current_user: UserInDB = Depends(get_current_active_user),
+    model: ModelUpload = Depends(get_model_body)
     ):
-    fdec = base64.b64decode(fenc)
     try:
-        tarball_path = dflow_service.generate_b64(fdec)
+        if stream:
+            return await stream_codegen(model.data)
+        tarball_path = await dflow_service.codegen(model.data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
@@ -121,7 +272,19 @@ async def gen_model_b64(
         )
     return FileResponse(tarball_path,
                         filename=os.path.basename(tarball_path),
-                        media_type='application/x-tar')
+                        media_type='application/x-tar',
+                        background=release_scratch(tarball_path))
+
+
+@router.get("/scratch",
+            response_model=Dict,
+            name="dsl:scratch_stats",
+            status_code=HTTP_200_OK
+            )
+async def get_scratch_stats(
+    current_user: UserInDB = Depends(get_current_active_user)
+    ):
+    return dflow_service.scratch.stats()
 
 
 @router.post("/model",
@@ -131,19 +294,21 @@ async def gen_model_b64(
              )
 async def store_model(
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
+    merged_repo: MergedModelRepository = Depends(get_repository(MergedModelRepository)),
     model_file: UploadFile = File(...),
     current_user: UserInDB = Depends(get_current_active_user)
     ):
-    fd = model_file.file
-    model_raw = dflow_service.unpack_model_from_file(fd)
+    model = await read_upload(model_file)
     user_id = current_user.id
     dmodel = await dmodel_repo.add_model_for_user(user_id=user_id,
-                                                  model_raw=model_raw)
+                                                  model_raw=model.text(),
+                                                  model_hash=model.hash)
     if not dmodel:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="User profile does not exist",
         )
+    await merged_repo.update_contribution(user_id=user_id, dmodel=dmodel)
 
 
 @router.post("/model/b64",
@@ -152,19 +317,21 @@ async def store_model(
              status_code=HTTP_200_OK
              )
 async def store_model_b64(
-    fenc: str = '',
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
-    current_user: UserInDB = Depends(get_current_active_user)
+    merged_repo: MergedModelRepository = Depends(get_repository(MergedModelRepository)),
+    current_user: UserInDB = Depends(get_current_active_user),
+    model: ModelUpload = Depends(get_model_body)
     ):
-    model_raw = base64.b64decode(fenc)
     user_id = current_user.id
     dmodel = await dmodel_repo.add_model_for_user(user_id=user_id,
-                                                  model_raw=model_raw)
+                                                  model_raw=model.text(),
+                                                  model_hash=model.hash)
     if not dmodel:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="User profile does not exist",
         )
+    await merged_repo.update_contribution(user_id=user_id, dmodel=dmodel)
 
 
 @router.get("/model/{model_id}",
@@ -174,9 +341,17 @@ async def store_model_b64(
             )
 async def get_model_by_id(
     model_id: int,
+    response: Response,
+    if_none_match: List[str] = Depends(get_if_none_match),
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
     ) -> DModelPublic:
+    if if_none_match:
+        unchanged = model_not_modified(
+            if_none_match,
+            await dmodel_repo.get_model_meta_by_id(model_id=model_id))
+        if unchanged:
+            return unchanged
     dmodel = await dmodel_repo.get_model_by_id(model_id=model_id)
     if not dmodel:
         raise HTTPException(
@@ -184,37 +359,41 @@ async def get_model_by_id(
             detail="User profile does not exist",
         )
     # print(dmodel)
+    response.headers.update(model_cache_headers(dmodel))
     resp = DModelPublic(**dmodel.dict())
     return resp
 
 
 @router.get("/merge",
-            response_class=FileResponse,
+            response_class=PlainTextResponse,
             name="model:merge_models",
             status_code=HTTP_200_OK
             )
 async def merge_models(
-    user_repo: UserRepository = Depends(get_repository(UserRepository)),
-    dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
+    if_none_match: List[str] = Depends(get_if_none_match),
+    merged_repo: MergedModelRepository = Depends(get_repository(MergedModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
-    ) -> FileResponse:
-    users = await user_repo.get_users()
-    models = []
-    for user in users:
-        username = dict(user.items())['username']
-        dmodel = await dmodel_repo.get_last_model_for_user(username=username)
-        if dmodel is not None:
-            models.append(dmodel)
-    merged_model = dflow_service.merge(models)
-    if not len(models):
+    ) -> Response:
+    merged = await merged_repo.get_merged_model()
+    if not merged.raw:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="Model storage is empty!",
         )
-    return FileResponse(
-        merged_model,
-        filename=os.path.basename(merged_model)
-    )
+    # Changes with every stored model, like the "last model" routes
+    etag = f'"{merged.version}-{merged.etag[0:16]}"'
+    if etag_matches(if_none_match, etag):
+        response = not_modified(etag, MODEL_CACHE_CONTROL)
+        response.headers['X-Model-Version'] = str(merged.version)
+        return response
+    headers = {
+        'ETag': etag,
+        'Cache-Control': MODEL_CACHE_CONTROL,
+        'X-Model-Version': str(merged.version),
+        'Content-Disposition':
+            f'attachment; filename="model-merged-v{merged.version}.dflow"',
+    }
+    return PlainTextResponse(merged.raw, headers=headers)
 
 
 @router.delete("/model/{model_id}",
@@ -225,33 +404,43 @@ async def merge_models(
 async def delete_model_by_id(
     model_id: int,
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
+    merged_repo: MergedModelRepository = Depends(get_repository(MergedModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
     ):
-    dmodel = await dmodel_repo.delete_model_by_id(model_id=model_id)
+    dmodel = await dmodel_repo.get_model_meta_by_id(model_id=model_id)
+    await dmodel_repo.delete_model_by_id(model_id=model_id)
+    if dmodel:
+        latest = await dmodel_repo.get_last_model_for_user_id(
+            user_id=dmodel.user_id)
+        await merged_repo.update_contribution(user_id=dmodel.user_id,
+                                              dmodel=latest,
+                                              replace=True)
     return 200
 
 
 @router.get("/model/{model_id}/file",
-            response_class=FileResponse,
+            response_class=Response,
             name="model:get_model_by_id",
             status_code=HTTP_200_OK
             )
 async def get_model_file_by_id(
     model_id: int,
+    if_none_match: List[str] = Depends(get_if_none_match),
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
-    ) -> FileResponse:
-
-    dmodel = await dmodel_repo.get_model_by_id(model_id=model_id)
+    ) -> Response:
+    dmodel = await dmodel_repo.get_model_meta_by_id(model_id=model_id)
     if not dmodel:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="",
         )
-    model_file = dflow_service.store_model_file_tmp(dmodel.raw, dmodel.id)
+    unchanged = model_not_modified(if_none_match, dmodel)
+    if unchanged:
+        return unchanged
+    raw = await dmodel_repo.get_model_raw(dmodel=dmodel)
 
-    return FileResponse(model_file,
-                        filename=os.path.basename(model_file))
+    return model_file_response(dmodel, raw)
 
 
 @router.get("/user/{username}/model/last",
@@ -260,10 +449,18 @@ async def get_model_file_by_id(
             status_code=HTTP_200_OK
             )
 async def get_last_model_for_user(
+    response: Response,
     username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9_-]+$"),
+    if_none_match: List[str] = Depends(get_if_none_match),
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
     ) -> DModelPublic:
+    if if_none_match:
+        unchanged = model_not_modified(
+            if_none_match,
+            await dmodel_repo.get_last_model_meta_for_user(username=username))
+        if unchanged:
+            return unchanged
 
     dmodel = await dmodel_repo.get_last_model_for_user(username=username)
     if not dmodel:
@@ -271,27 +468,64 @@ async def get_last_model_for_user(
             status_code=HTTP_400_BAD_REQUEST,
             detail="Model does not exist",
         )
+    response.headers.update(model_cache_headers(dmodel))
     return DModelPublic(**dmodel.dict())
 
 
+@router.get("/user/{username}/models",
+            response_model=DModelPage,
+            name="model:list_models_for_user",
+            status_code=HTTP_200_OK
+            )
+async def list_models_for_user(
+    username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9_-]+$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_raw: bool = False,
+    dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
+    current_user: UserInDB = Depends(get_current_active_user)
+    ) -> DModelPage:
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+    dmodels, next_after = await dmodel_repo.list_models_for_user(
+        username=username,
+        limit=limit,
+        after=after,
+        include_raw=include_raw
+    )
+    return DModelPage(
+        items=dmodels,
+        next_cursor=encode_cursor(*next_after) if next_after else None
+    )
+
+
 @router.get("/user/{username}/model/last/file",
-            response_class=FileResponse,
+            response_class=Response,
             name="model:get_last_model_file_for_user",
             status_code=HTTP_200_OK
             )
 async def get_last_model_file_for_user(
     username: str = Path(..., min_length=3, regex="^[a-zA-Z0-9_-]+$"),
+    if_none_match: List[str] = Depends(get_if_none_match),
     dmodel_repo: DModelRepository = Depends(get_repository(DModelRepository)),
     current_user: UserInDB = Depends(get_current_active_user)
-    ) -> FileResponse:
-
-    dmodel = await dmodel_repo.get_last_model_for_user(username=username)
+    ) -> Response:
+    dmodel = await dmodel_repo.get_last_model_meta_for_user(username=username)
     if not dmodel:
         raise HTTPException(
             status_code=HTTP_400_BAD_REQUEST,
             detail="Model does not exist",
         )
-    model_file = dflow_service.store_model_file_tmp(dmodel.raw, dmodel.id)
+    unchanged = model_not_modified(if_none_match, dmodel)
+    if unchanged:
+        return unchanged
+    raw = await dmodel_repo.get_model_raw(dmodel=dmodel)
 
-    return FileResponse(model_file,
-                        filename=os.path.basename(model_file))
+    return model_file_response(dmodel, raw)
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.concurrency import run_in_threadpool
+from starlette.status import HTTP_200_OK
+
+from app.core.metrics import render_metrics
+
+
+router = APIRouter()
+
+
+@router.get("/metrics",
+            response_class=Response,
+            name="metrics:get_metrics",
+            status_code=HTTP_200_OK,
+            include_in_schema=False
+            )
+async def get_metrics() -> Response:
+    # Collecting reads one file per process in multiprocess mode
+    body = await run_in_threadpool(render_metrics)
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
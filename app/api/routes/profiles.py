@@ -0,0 +1,41 @@
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from starlette.status import HTTP_200_OK, HTTP_404_NOT_FOUND
+
+from app.api.dependencies.auth import get_current_superuser
+from app.core.profiler import profile_store
+from app.models.user import UserInDB
+
+
+router = APIRouter()
+
+
+@router.get("/profiles",
+            response_model=List[Dict],
+            name="profiler:list_profiles",
+            status_code=HTTP_200_OK
+            )
+async def list_profiles(
+    current_user: UserInDB = Depends(get_current_superuser)
+    ) -> List[Dict]:
+    return profile_store.list()
+
+
+@router.get("/profiles/{name}",
+            response_class=FileResponse,
+            name="profiler:get_profile",
+            status_code=HTTP_200_OK
+            )
+async def get_profile(
+    name: str,
+    current_user: UserInDB = Depends(get_current_superuser)
+    ) -> FileResponse:
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=HTTP_404_NOT_FOUND,
+            detail="Profile does not exist",
+        )
+    return FileResponse(path, filename=name, media_type='text/plain')
@@ -67,8 +67,9 @@ async def user_login(
             response_model=UserPublic,
             name="user:get-current-user")
 async def get_currently_authenticated_user(
+    user_repo: UserRepository = Depends(get_repository(UserRepository)),
     current_user: UserInDB = Depends(get_current_active_user)) -> UserPublic:
-    return current_user
+    return await user_repo.populate_user(user=current_user)
 
 
 @router.get("/user/{username}",
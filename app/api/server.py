@@ -2,6 +2,8 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from app.core import config, tasks
+from app.core.metrics import MetricsMiddleware
+from app.core.profiler import ProfilerMiddleware
 
 from app.api.routes import router as api_router
 
@@ -16,6 +18,8 @@ def get_application():
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(ProfilerMiddleware)
+    app.add_middleware(MetricsMiddleware)
     app.include_router(api_router)
 
     app.add_event_handler("startup", tasks.create_start_app_handler(app))
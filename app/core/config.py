@@ -27,3 +27,85 @@ DATABASE_URL = config(
     cast=DatabaseURL,
     default=f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
+
+# DSL engine (textX validation / codegen) process pool, per API worker
+DSL_POOL_SIZE = config("DSL_POOL_SIZE", cast=int, default=2)
+DSL_MAX_QUEUE = config("DSL_MAX_QUEUE", cast=int, default=16)
+DSL_RETRY_AFTER = config("DSL_RETRY_AFTER", cast=int, default=5)
+
+# Validation results cache, shared by all API workers of a container
+CACHE_DIR = config("CACHE_DIR", cast=str, default="/tmp/dflow-cache")
+VALIDATION_CACHE_MAX_ENTRIES = config("VALIDATION_CACHE_MAX_ENTRIES", cast=int, default=10000)
+VALIDATION_CACHE_TTL = config("VALIDATION_CACHE_TTL", cast=int, default=24 * 60 * 60)  # one day
+
+# Content-addressed store for generated code tarballs; 0 disables it, and
+# with it the asynchronous codegen jobs, which deliver through the store
+ARTIFACT_STORE_MAX_BYTES = config("ARTIFACT_STORE_MAX_BYTES", cast=int, default=1024 * 1024 * 1024)  # 1 GiB
+
+# Stream codegen tarballs while they are compressed, instead of staging them
+CODEGEN_STREAMING = config("CODEGEN_STREAMING", cast=bool, default=False)
+
+# Scratch space janitor for /tmp/dflow
+SCRATCH_MAX_AGE = config("SCRATCH_MAX_AGE", cast=int, default=60 * 60)  # one hour
+SCRATCH_MAX_BYTES = config("SCRATCH_MAX_BYTES", cast=int, default=2 * 1024 * 1024 * 1024)  # 2 GiB
+SCRATCH_SWEEP_INTERVAL = config("SCRATCH_SWEEP_INTERVAL", cast=int, default=5 * 60)
+
+# How often (seconds) a worker checks whether the dflow grammar changed
+METAMODEL_CHECK_INTERVAL = config("METAMODEL_CHECK_INTERVAL", cast=int, default=30)
+
+# Background codegen jobs, per API worker
+CODEGEN_JOBS_MAX_RUNNING = config("CODEGEN_JOBS_MAX_RUNNING", cast=int, default=2)
+CODEGEN_JOBS_MAX_PENDING = config("CODEGEN_JOBS_MAX_PENDING", cast=int, default=64)
+# Jobs turned away by a busy DSL pool are retried with exponential backoff
+CODEGEN_JOBS_MAX_RETRIES = config("CODEGEN_JOBS_MAX_RETRIES", cast=int, default=5)
+# Workers touch their unfinished jobs every CODEGEN_JOBS_HEARTBEAT seconds;
+# unfinished jobs untouched for CODEGEN_JOBS_STALE_AFTER seconds belonged
+# to a worker that died and are marked failed.
+CODEGEN_JOBS_HEARTBEAT = config("CODEGEN_JOBS_HEARTBEAT", cast=int, default=30)
+CODEGEN_JOBS_STALE_AFTER = config("CODEGEN_JOBS_STALE_AFTER", cast=int, default=150)
+VALIDATION_BATCH_MAX_MODELS = config("VALIDATION_BATCH_MAX_MODELS", cast=int, default=1000)
+VALIDATION_BATCH_MAX_BYTES = config("VALIDATION_BATCH_MAX_BYTES", cast=int, default=64 * 1024 * 1024)  # 64 MiB
+
+# Authenticated user cache, per API worker. Entries are only dropped on
+# expiry, so user changes can take up to AUTH_CACHE_TTL seconds to apply.
+AUTH_CACHE_TTL = config("AUTH_CACHE_TTL", cast=int, default=30)
+AUTH_CACHE_MAX_ENTRIES = config("AUTH_CACHE_MAX_ENTRIES", cast=int, default=10000)
+
+# bcrypt hashing pool, per API worker
+PASSWORD_HASH_THREADS = config("PASSWORD_HASH_THREADS", cast=int, default=2)
+PASSWORD_HASH_MAX_WAITING = config("PASSWORD_HASH_MAX_WAITING", cast=int, default=32)
+
+# Model version storage: consecutive versions of a user's model are stored
+# as deltas, with a full snapshot at least every MODEL_SNAPSHOT_INTERVAL
+# versions; the compaction job re-snapshots chains deeper than
+# MODEL_DELTA_MAX_CHAIN.
+MODEL_SNAPSHOT_INTERVAL = config("MODEL_SNAPSHOT_INTERVAL", cast=int, default=50)
+MODEL_DELTA_MAX_CHAIN = config("MODEL_DELTA_MAX_CHAIN", cast=int, default=10)
+MODEL_COMPACTION_INTERVAL = config("MODEL_COMPACTION_INTERVAL", cast=int, default=10 * 60)
+# Deltas are only computed between texts under these bounds that share
+# at least MODEL_DELTA_MIN_RATIO of their lines; other versions are
+# stored as snapshots.
+MODEL_DELTA_MAX_BYTES = config("MODEL_DELTA_MAX_BYTES", cast=int, default=512 * 1024)  # 512 KiB
+MODEL_DELTA_MAX_LINES = config("MODEL_DELTA_MAX_LINES", cast=int, default=20000)
+MODEL_DELTA_MIN_RATIO = config("MODEL_DELTA_MIN_RATIO", cast=float, default=0.5)
+# Model texts kept per API worker for reads and downloads, bounded by count
+# and total size; texts over MODEL_TEXT_CACHE_MAX_ITEM_BYTES are not kept.
+# 0 entries disables it.
+MODEL_TEXT_CACHE_ENTRIES = config("MODEL_TEXT_CACHE_ENTRIES", cast=int, default=1024)
+MODEL_TEXT_CACHE_MAX_BYTES = config("MODEL_TEXT_CACHE_MAX_BYTES", cast=int, default=64 * 1024 * 1024)  # 64 MiB
+MODEL_TEXT_CACHE_MAX_ITEM_BYTES = config("MODEL_TEXT_CACHE_MAX_ITEM_BYTES", cast=int, default=1024 * 1024)  # 1 MiB
+
+# Largest model accepted by the upload routes
+MODEL_MAX_BYTES = config("MODEL_MAX_BYTES", cast=int, default=5 * 1024 * 1024)  # 5 MiB
+
+# Request profiler. When enabled, a PROFILER_SAMPLE_RATE fraction of the
+# requests, and every request slower than PROFILER_SLOW_THRESHOLD seconds
+# (0 turns that off), is profiled. A request carrying the
+# X-Profile-Token: <PROFILER_ADMIN_TOKEN> header is always profiled.
+PROFILER_ENABLED = config("PROFILER_ENABLED", cast=bool, default=False)
+PROFILER_SAMPLE_RATE = config("PROFILER_SAMPLE_RATE", cast=float, default=0.01)
+PROFILER_SLOW_THRESHOLD = config("PROFILER_SLOW_THRESHOLD", cast=float, default=2.0)
+PROFILER_ADMIN_TOKEN = config("PROFILER_ADMIN_TOKEN", cast=Secret, default="")
+PROFILER_INTERVAL = config("PROFILER_INTERVAL", cast=float, default=0.005)  # seconds between stack samples
+PROFILER_DIR = config("PROFILER_DIR", cast=str, default="/tmp/dflow-profiles")
+PROFILER_MAX_FILES = config("PROFILER_MAX_FILES", cast=int, default=100)
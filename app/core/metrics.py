@@ -0,0 +1,183 @@
+"""
+Prometheus metrics.
+
+With PROMETHEUS_MULTIPROC_DIR set (it must be set before the workers start
+and emptied on every deploy), each process, uvicorn workers and DSL pool
+processes alike, writes its samples there and /metrics reports the sum
+over all of them. Without it, metrics cover the serving process only.
+"""
+import os
+import time
+from typing import Callable, Dict, Optional
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "dflow_http_request_duration_seconds",
+    "HTTP request latency, by route name",
+    ["route", "method", "status"],
+)
+
+ENGINE_LATENCY = Histogram(
+    "dflow_engine_duration_seconds",
+    "Time spent in the DSL engine, by stage",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+             10.0, 30.0, 60.0, float("inf")),
+)
+
+DB_POOL_WAIT = Histogram(
+    "dflow_db_pool_wait_seconds",
+    "Time spent waiting for a database connection",
+)
+
+DB_POOL_SIZE = Gauge(
+    "dflow_db_pool_connections",
+    "Open database connections",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_IN_USE = Gauge(
+    "dflow_db_pool_connections_in_use",
+    "Database connections checked out of the pool",
+    multiprocess_mode="livesum",
+)
+
+PASSWORD_HASH_WAIT = Histogram(
+    "dflow_password_hash_wait_seconds",
+    "Time password hashing calls wait for a hashing thread",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+             5.0, float("inf")),
+)
+
+PASSWORD_HASH_IN_FLIGHT = Gauge(
+    "dflow_password_hash_in_flight",
+    "Password hashing calls queued or running",
+    multiprocess_mode="livesum",
+)
+
+PASSWORD_HASH_REJECTED = Counter(
+    "dflow_password_hash_rejected",
+    "Password hashing calls turned away because the queue was full",
+)
+
+SCRATCH_BYTES = Gauge(
+    "dflow_scratch_bytes",
+    "Size of the scratch space, as of the last sweep",
+    multiprocess_mode="mostrecent",
+)
+
+SCRATCH_FILES = Gauge(
+    "dflow_scratch_files",
+    "Files in the scratch space, as of the last sweep",
+    multiprocess_mode="mostrecent",
+)
+
+
+def engine_timer(stage: str):
+    """Context manager timing one DSL engine stage"""
+    return ENGINE_LATENCY.labels(stage).time()
+
+
+def render_metrics() -> bytes:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def mark_process_dead() -> None:
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class TimedPool:
+    """
+    Wraps the asyncpg pool of a databases.Database to record how long
+    connections take to acquire and how many are checked out.
+    """
+
+    def __init__(self, pool) -> None:
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    async def acquire(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = await self._pool.acquire(*args, **kwargs)
+        DB_POOL_WAIT.observe(time.perf_counter() - start)
+        DB_POOL_IN_USE.inc()
+        DB_POOL_SIZE.set(self._pool.get_size())
+        return connection
+
+    async def release(self, connection, *args, **kwargs):
+        try:
+            return await self._pool.release(connection, *args, **kwargs)
+        finally:
+            DB_POOL_IN_USE.dec()
+
+
+def instrument_database(database) -> None:
+    backend = database._backend
+    if getattr(backend, "_pool", None) is not None:
+        backend._pool = TimedPool(backend._pool)
+        DB_POOL_SIZE.set(backend._pool.get_size())
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and labels it with the name of the route
+    that handled it. Plain ASGI, so it does not buffer the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._route_names: Optional[Dict[Callable, str]] = None
+
+    def route_name(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_names is None:
+            self._route_names = {
+                route.endpoint: route.name
+                for route in scope["app"].routes
+                if hasattr(route, "endpoint")
+            }
+        return self._route_names.get(endpoint, "unmatched")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(
+                self.route_name(scope), scope["method"], str(status)
+            ).observe(time.perf_counter() - start)
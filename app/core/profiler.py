@@ -0,0 +1,208 @@
+"""
+Opt-in request profiler.
+
+A sampling profiler: while at least one request is being profiled, a
+background thread records the stack of the thread serving each of those
+requests every PROFILER_INTERVAL seconds. Requests share the event loop,
+so a profile also shows whatever else the loop ran meanwhile. Work sent
+to the DSL pool shows up as the await on it.
+
+Profiles are written in collapsed-stack format (one ``frame;frame;... N``
+line per distinct stack, as read by flamegraph.pl or speedscope) to a
+directory kept to the newest PROFILER_MAX_FILES files.
+"""
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import (
+    PROFILER_ADMIN_TOKEN,
+    PROFILER_DIR,
+    PROFILER_ENABLED,
+    PROFILER_INTERVAL,
+    PROFILER_MAX_FILES,
+    PROFILER_SAMPLE_RATE,
+    PROFILER_SLOW_THRESHOLD,
+)
+
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_SUFFIX = ".collapsed"
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.collapsed$")
+
+
+class Recording:
+    def __init__(self, thread_id: int) -> None:
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n"
+                       for stack, count in self.stacks.most_common())
+
+
+def collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{os.path.basename(code.co_filename)}:"
+                      f"{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class StackSampler:
+    """Samples the threads of the active recordings, only while any exist"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._recordings: List[Recording] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self) -> Recording:
+        recording = Recording(threading.get_ident())
+        with self._lock:
+            self._recordings.append(recording)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name="profiler", daemon=True)
+                self._thread.start()
+        return recording
+
+    def end(self, recording: Recording) -> None:
+        with self._lock:
+            self._recordings.remove(recording)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._recordings:
+                    self._thread = None
+                    return
+                recordings = list(self._recordings)
+            frames = sys._current_frames()
+            stacks: Dict[int, str] = {}
+            for recording in recordings:
+                thread_id = recording.thread_id
+                if thread_id not in stacks:
+                    frame = frames.get(thread_id)
+                    stacks[thread_id] = collapse(frame) if frame else ""
+                if stacks[thread_id]:
+                    recording.stacks[stacks[thread_id]] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Profile files in one directory, keeping only the newest max_files"""
+
+    def __init__(self, root: str, max_files: int) -> None:
+        self.root = root
+        self.max_files = max_files
+
+    def save(self, label: str, elapsed: float, content: str) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        label = re.sub(r"[^\w-]+", "_", label).strip("_")[0:60] or "root"
+        name = (f"{time.strftime('%Y%m%dT%H%M%S')}-{label}-"
+                f"{int(elapsed * 1000)}ms-{os.getpid()}-{uuid.uuid4().hex[0:6]}"
+                f"{PROFILE_SUFFIX}")
+        tmp_path = os.path.join(self.root, f".{name}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, os.path.join(self.root, name))
+        self.trim()
+        return name
+
+    def list(self) -> List[Dict]:
+        """Stored profiles, newest first"""
+        profiles = []
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return []
+        for entry in entries:
+            if not PROFILE_NAME_RE.match(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            profiles.append({"name": entry.name,
+                             "size": st.st_size,
+                             "created_at": st.st_mtime})
+        profiles.sort(key=lambda p: p["created_at"], reverse=True)
+        return profiles
+
+    def path(self, name: str) -> Optional[str]:
+        if not PROFILE_NAME_RE.match(name):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def trim(self) -> None:
+        for profile in self.list()[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.root, profile["name"]))
+            except FileNotFoundError:
+                pass
+
+
+sampler = StackSampler(PROFILER_INTERVAL)
+profile_store = ProfileStore(PROFILER_DIR, PROFILER_MAX_FILES)
+
+
+class ProfilerMiddleware:
+    """
+    Profiles a sample of the requests, the slow ones, and those carrying
+    the admin profile token. With the profiler disabled and no admin token
+    configured, requests pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.enabled = PROFILER_ENABLED
+        self.token = str(PROFILER_ADMIN_TOKEN).encode()
+
+    def forced(self, scope: Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not (self.enabled or self.token):
+            await self.app(scope, receive, send)
+            return
+
+        sampled = bool(self.token) and self.forced(scope)
+        if not sampled and self.enabled:
+            sampled = random.random() < PROFILER_SAMPLE_RATE
+        if not sampled and not (self.enabled and PROFILER_SLOW_THRESHOLD > 0):
+            await self.app(scope, receive, send)
+            return
+
+        recording = sampler.begin()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.end(recording)
+            elapsed = time.perf_counter() - start
+            if recording.stacks and \
+                    (sampled or elapsed >= PROFILER_SLOW_THRESHOLD):
+                await run_in_threadpool(
+                    profile_store.save,
+                    f"{scope['method']}{scope['path']}",
+                    elapsed,
+                    recording.collapsed())
@@ -1,18 +1,42 @@
+import logging
 from typing import Callable
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 
-from app.db.tasks import connect_to_db, close_db_connection
+from app.core.metrics import mark_process_dead
+from app.db.tasks import (
+    connect_to_db,
+    close_db_connection,
+    start_model_compaction,
+    stop_model_compaction,
+)
+from app.services import codegen_job_runner, dflow_service
+
+logger = logging.getLogger(__name__)
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
         await connect_to_db(app)
+        # With a DSL pool, parsing happens in the pool processes, which
+        # build their own metamodel when dflow_service.start() warms them
+        if dflow_service.executor.pool_size <= 0:
+            elapsed = await run_in_threadpool(dflow_service.load_metamodel)
+            logger.warning(f"Built dflow metamodel in {elapsed:.3f}s")
+        await dflow_service.start()
+        if getattr(app.state, "_db", None) is not None:
+            codegen_job_runner.start(app.state._db)
+        start_model_compaction(app)
 
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
+        stop_model_compaction(app)
+        await codegen_job_runner.shutdown()
+        dflow_service.shutdown()
         await close_db_connection(app)
+        mark_process_dead()
 
     return stop_app
@@ -0,0 +1,70 @@
+"""add model blob deltas
+
+Revision ID: 3f8c1a6b2d97
+Revises: e2a9d4c7b318
+Create Date: 2026-10-18 19:02:41.538120
+
+"""
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '3f8c1a6b2d97'
+down_revision = 'e2a9d4c7b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # A blob with a base_hash holds a delta against that blob instead of the
+    # full text; depth is the number of deltas down to the full snapshot.
+    op.add_column(
+        "model_blobs",
+        sa.Column("base_hash", sa.Text,
+                  sa.ForeignKey("model_blobs.hash"), nullable=True,
+                  index=True),
+    )
+    op.add_column(
+        "model_blobs",
+        sa.Column("depth", sa.Integer, nullable=False, server_default="0"),
+    )
+    # Only deltas are ever looked up by depth, by the compaction job
+    op.create_index(
+        "ix_model_blobs_depth", "model_blobs", ["depth"],
+        postgresql_where=sa.text("depth > 0"),
+    )
+
+
+def materialize_deltas() -> None:
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text("SELECT hash, data, base_hash FROM model_blobs ORDER BY depth")
+    )
+    texts = {}
+    for m_hash, data, base_hash in rows.fetchall():
+        if base_hash is None:
+            texts[m_hash] = zlib.decompress(data).decode('utf8')
+            continue
+        base_lines = texts[base_hash].splitlines(keepends=True)
+        parts = []
+        for op_ in json.loads(zlib.decompress(data).decode('utf8')):
+            if isinstance(op_, str):
+                parts.append(op_)
+            else:
+                parts.extend(base_lines[op_[0]:op_[1]])
+        texts[m_hash] = ''.join(parts)
+        conn.execute(
+            sa.text("UPDATE model_blobs SET data = :data WHERE hash = :hash"),
+            data=zlib.compress(texts[m_hash].encode('utf8')), hash=m_hash
+        )
+
+
+def downgrade() -> None:
+    materialize_deltas()
+    op.drop_index("ix_model_blobs_depth", table_name="model_blobs")
+    op.drop_column("model_blobs", "depth")
+    op.drop_column("model_blobs", "base_hash")
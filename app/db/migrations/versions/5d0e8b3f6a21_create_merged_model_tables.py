@@ -0,0 +1,63 @@
+"""create merged model tables
+
+Revision ID: 5d0e8b3f6a21
+Revises: c41f7a2d9e10
+Create Date: 2026-10-18 17:10:42.930114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '5d0e8b3f6a21'
+down_revision = 'c41f7a2d9e10'
+branch_labels = None
+depends_on = None
+
+
+def create_merge_contributions_table() -> None:
+    # What each user's latest model contributes to the merged model
+    op.create_table(
+        "merge_contributions",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id",
+                                                       ondelete="CASCADE"),
+                  primary_key=True),
+        sa.Column("model_id", sa.Integer, nullable=False),
+        sa.Column("model_updated_at", sa.TIMESTAMP(timezone=True),
+                  nullable=False),
+        sa.Column("sections", sa.Text, nullable=False),
+    )
+
+
+def create_merged_model_table() -> None:
+    # Single row (id = 1) holding the current merged model
+    op.create_table(
+        "merged_model",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("raw", sa.Text, nullable=False, server_default=""),
+        sa.Column("version", sa.BigInteger, nullable=False,
+                  server_default="0"),
+        sa.Column("etag", sa.Text, nullable=False, server_default=""),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True),
+                  server_default=sa.func.now(), nullable=False),
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_merged_model_modtime
+            BEFORE UPDATE
+            ON merged_model
+            FOR EACH ROW
+        EXECUTE PROCEDURE update_updated_at_column();
+        """
+    )
+
+
+def upgrade() -> None:
+    create_merge_contributions_table()
+    create_merged_model_table()
+
+
+def downgrade() -> None:
+    op.drop_table("merged_model")
+    op.drop_table("merge_contributions")
@@ -0,0 +1,32 @@
+"""add merged model version sequence
+
+Revision ID: 7b4e1d9a2c60
+Revises: 3f8c1a6b2d97
+Create Date: 2026-10-18 20:14:07.305861
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = '7b4e1d9a2c60'
+down_revision = '3f8c1a6b2d97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Bumped after every change to merge_contributions; merged_model is
+    # stale while its version is below the sequence. Existing merged models
+    # are current, so the sequence continues from their version.
+    op.execute("CREATE SEQUENCE merged_model_version_seq MINVALUE 0")
+    op.execute(
+        """
+        SELECT setval('merged_model_version_seq',
+                      COALESCE((SELECT max(version) FROM merged_model), 0));
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP SEQUENCE merged_model_version_seq")
@@ -0,0 +1,131 @@
+"""create model blobs table
+
+Revision ID: 9b7c2e4d1f05
+Revises: 5d0e8b3f6a21
+Create Date: 2026-10-18 18:21:05.127734
+
+"""
+import hashlib
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = '9b7c2e4d1f05'
+down_revision = '5d0e8b3f6a21'
+branch_labels = None
+depends_on = None
+
+
+def create_model_blobs_table() -> None:
+    # Distinct model contents, zlib compressed, addressed by their sha256
+    op.create_table(
+        "model_blobs",
+        sa.Column("hash", sa.Text, primary_key=True),
+        sa.Column("data", sa.LargeBinary, nullable=False),
+        sa.Column("size", sa.Integer, nullable=False),
+    )
+    op.add_column(
+        "models",
+        sa.Column("content_hash", sa.Text,
+                  sa.ForeignKey("model_blobs.hash"), nullable=True,
+                  index=True),
+    )
+
+
+# Rows are moved in id order, BATCH_SIZE at a time, so that the model
+# texts are never all in memory at once
+BATCH_SIZE = 500
+
+
+def disable_modtime_trigger() -> None:
+    # Moving the text is not a change to the model: keep updated_at, which
+    # orders a user's models and is part of their ETags and list cursors
+    op.execute("ALTER TABLE models DISABLE TRIGGER update_models_modtime")
+
+
+def enable_modtime_trigger() -> None:
+    op.execute("ALTER TABLE models ENABLE TRIGGER update_models_modtime")
+
+
+def move_raw_models_to_blobs() -> None:
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                """
+                SELECT id, raw
+                FROM models
+                WHERE raw IS NOT NULL AND id > :last_id
+                ORDER BY id LIMIT :limit
+                """
+            ),
+            last_id=last_id, limit=BATCH_SIZE
+        ).fetchall()
+        if not rows:
+            break
+        for model_id, raw in rows:
+            raw_bytes = raw.encode('utf8')
+            m_hash = hashlib.sha256(raw_bytes).hexdigest()
+            conn.execute(
+                sa.text(
+                    """
+                    INSERT INTO model_blobs (hash, data, size)
+                    VALUES (:hash, :data, :size)
+                    ON CONFLICT (hash) DO NOTHING
+                    """
+                ),
+                hash=m_hash, data=zlib.compress(raw_bytes), size=len(raw_bytes)
+            )
+            conn.execute(
+                sa.text(
+                    "UPDATE models SET raw = NULL, content_hash = :hash WHERE id = :id"
+                ),
+                hash=m_hash, id=model_id
+            )
+        last_id = rows[-1][0]
+
+
+def move_blobs_to_raw_models() -> None:
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text(
+                """
+                SELECT m.id, b.data
+                FROM models m
+                    INNER JOIN model_blobs b
+                    ON b.hash = m.content_hash
+                WHERE m.id > :last_id
+                ORDER BY m.id LIMIT :limit
+                """
+            ),
+            last_id=last_id, limit=BATCH_SIZE
+        ).fetchall()
+        if not rows:
+            break
+        for model_id, data in rows:
+            conn.execute(
+                sa.text("UPDATE models SET raw = :raw WHERE id = :id"),
+                raw=zlib.decompress(data).decode('utf8'), id=model_id
+            )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    create_model_blobs_table()
+    disable_modtime_trigger()
+    move_raw_models_to_blobs()
+    enable_modtime_trigger()
+
+
+def downgrade() -> None:
+    disable_modtime_trigger()
+    move_blobs_to_raw_models()
+    enable_modtime_trigger()
+    op.drop_column("models", "content_hash")
+    op.drop_table("model_blobs")
@@ -0,0 +1,46 @@
+"""create codegen jobs table
+
+Revision ID: c41f7a2d9e10
+Revises: 8a3258909a29
+Create Date: 2026-10-18 16:02:11.418211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'c41f7a2d9e10'
+down_revision = '8a3258909a29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "codegen_jobs",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id",
+                                                       ondelete="CASCADE"),
+                  nullable=False, index=True),
+        sa.Column("status", sa.Text, nullable=False, server_default="queued"),
+        sa.Column("artifact_key", sa.Text, nullable=True),
+        sa.Column("error", sa.Text, nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True),
+                  server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True),
+                  server_default=sa.func.now(), nullable=False),
+    )
+    op.execute(
+        """
+        CREATE TRIGGER update_codegen_jobs_modtime
+            BEFORE UPDATE
+            ON codegen_jobs
+            FOR EACH ROW
+        EXECUTE PROCEDURE update_updated_at_column();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("codegen_jobs")
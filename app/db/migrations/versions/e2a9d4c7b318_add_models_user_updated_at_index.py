@@ -0,0 +1,30 @@
+"""add models (user_id, updated_at) index
+
+Revision ID: e2a9d4c7b318
+Revises: 9b7c2e4d1f05
+Create Date: 2026-10-18 18:58:31.604412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'e2a9d4c7b318'
+down_revision = '9b7c2e4d1f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Serves "latest model(s) of a user" lookups as an index range scan,
+    # already in the order they need
+    op.create_index(
+        "ix_models_user_id_updated_at",
+        "models",
+        ["user_id", sa.text("updated_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_models_user_id_updated_at", table_name="models")
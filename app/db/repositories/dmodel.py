@@ -1,61 +1,254 @@
+import base64
+import binascii
+import hashlib
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import (
+    MODEL_DELTA_MAX_BYTES,
+    MODEL_DELTA_MAX_LINES,
+    MODEL_DELTA_MIN_RATIO,
+    MODEL_SNAPSHOT_INTERVAL,
+    MODEL_TEXT_CACHE_ENTRIES,
+    MODEL_TEXT_CACHE_MAX_BYTES,
+    MODEL_TEXT_CACHE_MAX_ITEM_BYTES,
+)
 from app.db.repositories.base import BaseRepository
+from app.services.cache import LRUCache
+from app.services.delta import apply_delta, decode_delta, encode_delta, make_delta
+
+from app.models.dmodel import DModelInsert, DModelInDB, DModelMeta, DModelPublic
+
+
+# Model text is stored once per distinct content in model_blobs; models rows
+# reference it by content_hash. Migration 9b7c2e4d1f05 moved the text of
+# older rows there as well and left their models.raw NULL; raw is still
+# read when set, as a fallback. A blob is either the full text, zlib
+# compressed, or, when it has a base_hash, a delta against the previous
+# version of the same user's model (see app.services.delta); depth counts
+# the deltas down to the full snapshot.
+ADD_MODEL_BLOB_QUERY = """
+    INSERT INTO model_blobs (hash, data, size, base_hash, depth)
+    VALUES (:hash, :data, :size, :base_hash, :depth)
+    ON CONFLICT (hash) DO NOTHING;
+"""
+
+MODEL_BLOB_EXISTS_QUERY = """
+    SELECT 1 FROM model_blobs WHERE hash = :hash;
+"""
 
-from app.models.dmodel import DModelInsert, DModelInDB, DModelPublic
+GET_LAST_BLOB_FOR_USER_ID_QUERY = """
+    SELECT b.hash, b.depth
+    FROM models m
+        INNER JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = :user_id
+    ORDER BY m.updated_at DESC, m.id DESC LIMIT 1;
+"""
 
+# The blobs of several models and all their bases, each blob once
+GET_BLOB_CHAINS_QUERY = """
+    WITH RECURSIVE chain AS (
+        SELECT hash, base_hash
+        FROM model_blobs
+        WHERE hash = ANY(:hashes)
+        UNION
+        SELECT b.hash, b.base_hash
+        FROM model_blobs b
+            INNER JOIN chain c
+            ON b.hash = c.base_hash
+    )
+    SELECT b.hash, b.data, b.base_hash
+    FROM model_blobs b
+        INNER JOIN chain c
+        ON c.hash = b.hash;
+"""
+
+# Served by the partial index on model_blobs (depth) WHERE depth > 0
+GET_DEEP_CHAIN_BLOBS_QUERY = """
+    SELECT hash
+    FROM model_blobs
+    WHERE depth > :max_depth AND NOT (hash = ANY(:skip))
+    ORDER BY depth LIMIT :limit;
+"""
+
+GET_BLOB_DEPTH_QUERY = """
+    SELECT depth FROM model_blobs WHERE hash = :hash;
+"""
+
+# Session level, so only one worker compacts at a time; it must be released
+# on the connection that took it
+MODEL_COMPACTION_LOCK_ID = 0x646d6f64
+TRY_LOCK_COMPACTION_QUERY = """
+    SELECT pg_try_advisory_lock(:lock_id);
+"""
+
+UNLOCK_COMPACTION_QUERY = """
+    SELECT pg_advisory_unlock(:lock_id);
+"""
+
+SNAPSHOT_MODEL_BLOB_QUERY = """
+    UPDATE model_blobs
+    SET data = :data, base_hash = NULL, depth = 0
+    WHERE hash = :hash;
+"""
+
+# After a blob became a snapshot, recompute the depth of the deltas built
+# on top of it
+REBASE_BLOB_DEPTHS_QUERY = """
+    WITH RECURSIVE tree AS (
+        SELECT hash, 0 AS depth
+        FROM model_blobs
+        WHERE hash = :hash
+        UNION ALL
+        SELECT b.hash, t.depth + 1
+        FROM model_blobs b
+            INNER JOIN tree t
+            ON b.base_hash = t.hash
+    )
+    UPDATE model_blobs
+    SET depth = tree.depth
+    FROM tree
+    WHERE model_blobs.hash = tree.hash AND model_blobs.depth <> tree.depth;
+"""
 
 ADD_MODEL_FOR_USER_QUERY = """
-    INSERT INTO models (raw, user_id)
-    VALUES (:raw, :user_id)
-    RETURNING id, raw, user_id, created_at, updated_at;
+    INSERT INTO models (user_id, content_hash)
+    VALUES (:user_id, :content_hash)
+    RETURNING id, user_id, content_hash, created_at, updated_at;
 """
 
 GET_MODEL_BY_ID_QUERY = """
-    SELECT id, raw, user_id, created_at, updated_at
-    FROM models
-    WHERE id = :id;
+    SELECT m.id, m.raw, b.data, b.base_hash, m.user_id, m.content_hash, m.created_at, m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.id = :id;
 """
 
+# The user lookups below resolve the username once, through the unique
+# users.username index, and then read the (user_id, updated_at DESC, id DESC)
+# index of models, so they never scan or sort the models table.
 GET_MODEL_BY_USER_ID_QUERY = """
-    SELECT id, raw, user_id, created_at, updated_at
-    FROM models
-    WHERE user_id = :user_id;
+    SELECT m.id, m.raw, b.data, b.base_hash, m.user_id, m.content_hash, m.created_at, m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = :user_id
+    ORDER BY m.updated_at DESC, m.id DESC;
 """
 
 GET_MODEL_BY_USERNAME_QUERY = """
+    SELECT m.id, m.raw, b.data, b.base_hash, m.user_id, m.content_hash, m.created_at, m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = (SELECT id FROM users WHERE username = :username)
+    ORDER BY m.updated_at DESC, m.id DESC;
+"""
+
+GET_LAST_MODEL_FOR_USER_QUERY = """
+    SELECT m.id, m.raw, b.data, b.base_hash, m.user_id, m.content_hash, m.created_at, m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = (SELECT id FROM users WHERE username = :username)
+    ORDER BY m.updated_at DESC, m.id DESC LIMIT 1;
+"""
+
+# Metadata only, to answer conditional requests without reading the text
+GET_MODEL_META_BY_ID_QUERY = """
     SELECT m.id,
-           raw,
-           user_id,
+           m.user_id,
+           m.content_hash,
+           COALESCE(b.size, octet_length(m.raw)) AS size,
            m.created_at,
            m.updated_at
     FROM models m
-        INNER JOIN users u
-        ON m.user_id = u.id
-    WHERE user_id = (SELECT id FROM users WHERE username = :username);
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.id = :id;
 """
 
-GET_LAST_MODEL_FOR_USER_QUERY = """
+GET_LAST_MODEL_META_FOR_USER_QUERY = """
     SELECT m.id,
-           raw,
-           user_id,
+           m.user_id,
+           m.content_hash,
+           COALESCE(b.size, octet_length(m.raw)) AS size,
            m.created_at,
            m.updated_at
     FROM models m
-        INNER JOIN users u
-        ON m.user_id = u.id
-    WHERE user_id = (SELECT id FROM users WHERE username = :username)
-    ORDER BY (updated_at) DESC LIMIT 1;
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = (SELECT id FROM users WHERE username = :username)
+    ORDER BY m.updated_at DESC, m.id DESC LIMIT 1;
 """
 
-GET_LAST_MODEL_FOR_ALL_USERS_QUERY = """
+LIST_MODELS_FOR_USER_QUERY = """
+    SELECT m.id,
+           m.user_id,
+           m.content_hash,
+           COALESCE(b.size, octet_length(m.raw)) AS size,
+           CASE WHEN :include_raw THEN m.raw END AS raw,
+           CASE WHEN :include_raw THEN b.data END AS data,
+           b.base_hash,
+           m.created_at,
+           m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = (SELECT id FROM users WHERE username = :username)
+    ORDER BY m.updated_at DESC, m.id DESC
+    LIMIT :limit;
+"""
+
+# Keyset pagination: continue right after the (updated_at, id) of the last
+# row of the previous page
+LIST_MODELS_FOR_USER_AFTER_QUERY = """
     SELECT m.id,
-           raw,
-           user_id,
+           m.user_id,
+           m.content_hash,
+           COALESCE(b.size, octet_length(m.raw)) AS size,
+           CASE WHEN :include_raw THEN m.raw END AS raw,
+           CASE WHEN :include_raw THEN b.data END AS data,
+           b.base_hash,
            m.created_at,
            m.updated_at
     FROM models m
-        INNER JOIN users u
-        ON m.user_id = u.id
-    ORDER BY (updated_at);
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = (SELECT id FROM users WHERE username = :username)
+      AND (m.updated_at, m.id) < (:after_updated_at, :after_id)
+    ORDER BY m.updated_at DESC, m.id DESC
+    LIMIT :limit;
+"""
+
+GET_LAST_MODEL_FOR_USER_ID_QUERY = """
+    SELECT m.id, m.raw, b.data, b.base_hash, m.user_id, m.content_hash, m.created_at, m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    WHERE m.user_id = :user_id
+    ORDER BY m.updated_at DESC, m.id DESC LIMIT 1;
+"""
+
+GET_LAST_MODEL_FOR_ALL_USERS_QUERY = """
+    SELECT DISTINCT ON (m.user_id)
+           m.id,
+           m.raw,
+           b.data,
+           b.base_hash,
+           m.user_id,
+           m.content_hash,
+           m.created_at,
+           m.updated_at
+    FROM models m
+        LEFT JOIN model_blobs b
+        ON b.hash = m.content_hash
+    ORDER BY m.user_id, m.updated_at DESC, m.id DESC;
 """
 
 DELETE_MODEL_BY_ID_QUERY = """
@@ -64,19 +257,278 @@ DELETE_MODEL_BY_ID_QUERY = """
 """
 
 
+def encode_cursor(updated_at: datetime, model_id: int) -> str:
+    token = f"{updated_at.isoformat()}|{model_id}"
+    return base64.urlsafe_b64encode(token.encode('utf8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a cursor that was not made by encode_cursor"""
+    try:
+        token = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf8')
+        updated_at, model_id = token.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(model_id)
+    except (UnicodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+
+
+def content_hash(model_raw: str) -> str:
+    return hashlib.sha256(model_raw.encode('utf8')).hexdigest()
+
+
+def compress_model(model_raw: str) -> bytes:
+    return zlib.compress(model_raw.encode('utf8'))
+
+
+def decompress_model(data: bytes) -> str:
+    return zlib.decompress(data).decode('utf8')
+
+
+def encode_model_blob(base: Optional[str], model_raw: str) -> Tuple[bytes, Optional[bytes]]:
+    """
+    The compressed text and, when base is given and both texts are within
+    the MODEL_DELTA_* bounds, the encoded delta from base. CPU bound, run
+    it in the threadpool.
+    """
+    full = compress_model(model_raw)
+    if base is None or \
+            max(len(base), len(model_raw)) > MODEL_DELTA_MAX_BYTES:
+        return full, None
+    delta = make_delta(base, model_raw,
+                       max_lines=MODEL_DELTA_MAX_LINES,
+                       min_ratio=MODEL_DELTA_MIN_RATIO)
+    return full, encode_delta(delta) if delta is not None else None
+
+
+def rebuild_texts(hashes: Iterable[str],
+                  blobs: Mapping[str, Mapping],
+                  known: Dict[str, str]) -> Dict[str, str]:
+    """
+    The texts of hashes, given their blobs and those of all their bases by
+    hash. Texts in known are used instead of walking further down a chain,
+    and every text rebuilt on the way is added to it. CPU bound, run it in
+    the threadpool.
+    """
+    for m_hash in hashes:
+        chain = []
+        h = m_hash
+        while h not in known and h in blobs:
+            blob = blobs[h]
+            if blob["base_hash"] is None:
+                known[h] = decompress_model(blob["data"])
+                break
+            chain.append(blob)
+            h = blob["base_hash"]
+        if h not in known:
+            continue
+        for blob in reversed(chain):
+            known[blob["hash"]] = apply_delta(known[blob["base_hash"]],
+                                              decode_delta(blob["data"]))
+    return {h: known[h] for h in hashes if h in known}
+
+
+# Reconstructed model texts by content hash. Blobs never change content,
+# so entries never go stale. Sizes are counted in characters, which is what
+# a mostly ASCII str takes in memory.
+model_text_cache = LRUCache(max_entries=MODEL_TEXT_CACHE_ENTRIES,
+                            max_bytes=MODEL_TEXT_CACHE_MAX_BYTES)
+
+
 class DModelRepository(BaseRepository):
+    async def _model_raw(self,
+                         record: Mapping,
+                         texts: Optional[Mapping[str, str]] = None
+                         ) -> Optional[str]:
+        if record["raw"] is not None or record["data"] is None:
+            return record["raw"]
+        if record["base_hash"] is None:
+            return decompress_model(record["data"])
+        if texts is not None and record["content_hash"] in texts:
+            return texts[record["content_hash"]]
+        return await self.get_model_text(model_hash=record["content_hash"])
+
+    async def _delta_texts(self, records: Iterable[Mapping]) -> Dict[str, str]:
+        """The texts of those records whose blob is a delta, in one query"""
+        return await self.get_model_texts(model_hashes=[
+            record["content_hash"] for record in records
+            if record["raw"] is None and record["data"] is not None
+            and record["base_hash"] is not None
+        ])
+
+    async def _to_dmodel(self,
+                         record: Optional[Mapping],
+                         texts: Optional[Mapping[str, str]] = None
+                         ) -> Optional[DModelInDB]:
+        if not record:
+            return None
+        dmodel = dict(record)
+        dmodel["raw"] = await self._model_raw(record, texts)
+        dmodel.pop("data", None)
+        dmodel.pop("base_hash", None)
+
+        return DModelInDB(**dmodel)
+
+    async def get_model_text(self, *, model_hash: str) -> Optional[str]:
+        """The text of a model blob, applying its delta chain if needed"""
+        texts = await self.get_model_texts(model_hashes=[model_hash])
+        return texts.get(model_hash)
+
+    async def get_model_texts(self, *, model_hashes: List[str]) -> Dict[str, str]:
+        """
+        The texts of several model blobs by hash, reading every blob of
+        their delta chains in a single query. Unknown hashes are left out.
+        """
+        texts = {}
+        missing = []
+        for m_hash in dict.fromkeys(model_hashes):
+            text = model_text_cache.get(m_hash)
+            if text is None:
+                missing.append(m_hash)
+            else:
+                texts[m_hash] = text
+        if not missing:
+            return texts
+        records = await self.db.fetch_all(
+            query=GET_BLOB_CHAINS_QUERY,
+            values={"hashes": missing}
+        )
+        blobs = {record["hash"]: record for record in records}
+        rebuilt = await run_in_threadpool(rebuild_texts, missing, blobs, {})
+        for m_hash, text in rebuilt.items():
+            if len(text) <= MODEL_TEXT_CACHE_MAX_ITEM_BYTES:
+                model_text_cache.put(m_hash, text)
+        texts.update(rebuilt)
+        return texts
+
+    async def get_model_raw(self, *, dmodel: DModelMeta) -> Optional[str]:
+        """
+        The text of a model looked up by its metadata. Text is cached by
+        content hash, so hot models are served without reading the blob.
+        """
+        if dmodel.raw is not None:
+            return dmodel.raw
+        if dmodel.content_hash is None:
+            full = await self.get_model_by_id(model_id=dmodel.id)
+            return full.raw if full else None
+        return await self.get_model_text(model_hash=dmodel.content_hash)
+
+    async def _make_model_blob(self,
+                               *,
+                               user_id: int,
+                               m_hash: str,
+                               model_raw: str) -> Mapping:
+        """
+        The model_blobs row for a new version of a user's model: a delta
+        against their previous version, unless the chain is due for a
+        snapshot, the texts are too large or too different to diff, or the
+        delta would not be smaller than the full text.
+        """
+        prev = await self.db.fetch_one(
+            query=GET_LAST_BLOB_FOR_USER_ID_QUERY,
+            values={"user_id": user_id}
+        )
+        base = None
+        if prev and prev["depth"] + 1 < MODEL_SNAPSHOT_INTERVAL:
+            base = await self.get_model_text(model_hash=prev["hash"])
+        full, delta = await run_in_threadpool(encode_model_blob, base, model_raw)
+        blob = {"hash": m_hash, "data": full,
+                "size": len(model_raw.encode('utf8')),
+                "base_hash": None, "depth": 0}
+        if delta is not None and len(delta) < len(full):
+            blob.update(data=delta, base_hash=prev["hash"],
+                        depth=prev["depth"] + 1)
+        return blob
+
+    async def compact_model_chains(self,
+                                   *,
+                                   max_depth: int,
+                                   limit: int = 100,
+                                   skip: Iterable[str] = ()) -> Tuple[int, List[str]]:
+        """
+        Turn blobs deeper than max_depth into full snapshots, shallowest
+        first, at most limit of them, leaving out the hashes in skip.
+        Nothing is done when another worker is already compacting.
+        Returns how many were rewritten and the hashes whose chain could
+        not be rebuilt.
+        """
+        compacted = 0
+        broken = []
+        async with self.db.connection() as connection:
+            locked = await connection.fetch_val(
+                query=TRY_LOCK_COMPACTION_QUERY,
+                values={"lock_id": MODEL_COMPACTION_LOCK_ID}
+            )
+            if not locked:
+                return compacted, broken
+            try:
+                records = await connection.fetch_all(
+                    query=GET_DEEP_CHAIN_BLOBS_QUERY,
+                    values={"max_depth": max_depth, "skip": list(skip), "limit": limit}
+                )
+                for record in records:
+                    m_hash = record["hash"]
+                    # Snapshotting an earlier candidate may have made this one
+                    # shallow enough already
+                    depth = await connection.fetch_val(
+                        query=GET_BLOB_DEPTH_QUERY,
+                        values={"hash": m_hash}
+                    )
+                    if depth is None or depth <= max_depth:
+                        continue
+                    text = await self.get_model_text(model_hash=m_hash)
+                    if text is None:
+                        broken.append(m_hash)
+                        continue
+                    async with connection.transaction():
+                        await connection.execute(
+                            query=SNAPSHOT_MODEL_BLOB_QUERY,
+                            values={"hash": m_hash, "data": compress_model(text)}
+                        )
+                        await connection.execute(
+                            query=REBASE_BLOB_DEPTHS_QUERY,
+                            values={"hash": m_hash}
+                        )
+                    compacted += 1
+            finally:
+                await connection.fetch_val(
+                    query=UNLOCK_COMPACTION_QUERY,
+                    values={"lock_id": MODEL_COMPACTION_LOCK_ID}
+                )
+        return compacted, broken
+
     async def add_model_for_user(self,
                                  *,
                                  user_id: str,
-                                 model_raw: str
+                                 model_raw: str,
+                                 model_hash: Optional[str] = None
                                  ) -> DModelInDB:
+        """model_hash, when given, must be the content_hash of model_raw"""
         m = DModelInsert(user_id=user_id, raw=model_raw)
-        dmodel = await self.db.fetch_one(
-            query=ADD_MODEL_FOR_USER_QUERY,
-            values=m.dict()
+        m_hash = model_hash or content_hash(m.raw)
+        # The blob is built before the transaction opens, so no connection
+        # is held while it is diffed; a concurrent insert of the same
+        # content is absorbed by the ON CONFLICT of ADD_MODEL_BLOB_QUERY.
+        exists = await self.db.fetch_val(
+            query=MODEL_BLOB_EXISTS_QUERY,
+            values={"hash": m_hash}
         )
+        blob = None
+        if not exists:
+            blob = await self._make_model_blob(user_id=m.user_id,
+                                               m_hash=m_hash,
+                                               model_raw=m.raw)
+        async with self.db.transaction():
+            if blob is not None:
+                await self.db.execute(query=ADD_MODEL_BLOB_QUERY, values=blob)
+            dmodel = await self.db.fetch_one(
+                query=ADD_MODEL_FOR_USER_QUERY,
+                values={"user_id": m.user_id, "content_hash": m_hash}
+            )
 
-        return dmodel
+        if not dmodel:
+            return None
+
+        return DModelInDB(**dmodel, raw=m.raw)
 
     async def get_model_by_id(self,
                               *,
@@ -86,10 +538,7 @@ class DModelRepository(BaseRepository):
             values={"id": model_id}
         )
 
-        if not dmodel:
-            return None
-
-        return DModelInDB(**dmodel)
+        return await self._to_dmodel(dmodel)
 
     async def get_models_for_user(self,
                                   *,
@@ -99,9 +548,7 @@ class DModelRepository(BaseRepository):
             values={"username": username}
         )
 
-        if dmodel:
-            return DModelInDB(**dmodel)
-        return dmodel
+        return await self._to_dmodel(dmodel)
 
     async def get_last_model_for_user(self,
                                       *,
@@ -111,19 +558,85 @@ class DModelRepository(BaseRepository):
             values={"username": username}
         )
 
-        if dmodel:
-            return DModelInDB(**dmodel)
-        return dmodel
+        return await self._to_dmodel(dmodel)
+
+    async def get_model_meta_by_id(self,
+                                   *,
+                                   model_id: int) -> Optional[DModelMeta]:
+        dmodel = await self.db.fetch_one(
+            query=GET_MODEL_META_BY_ID_QUERY,
+            values={"id": model_id}
+        )
+        if not dmodel:
+            return None
+
+        return DModelMeta(**dmodel)
+
+    async def get_last_model_meta_for_user(self,
+                                           *,
+                                           username: str) -> Optional[DModelMeta]:
+        dmodel = await self.db.fetch_one(
+            query=GET_LAST_MODEL_META_FOR_USER_QUERY,
+            values={"username": username}
+        )
+        if not dmodel:
+            return None
+
+        return DModelMeta(**dmodel)
+
+    async def list_models_for_user(
+            self,
+            *,
+            username: str,
+            limit: int,
+            after: Optional[Tuple[datetime, int]] = None,
+            include_raw: bool = False
+            ) -> Tuple[List[DModelMeta], Optional[Tuple[datetime, int]]]:
+        """
+        A page of a user's models, newest first. Returns the page and the
+        position to continue after, or None on the last page.
+        """
+        values = {"username": username,
+                  "limit": limit + 1,
+                  "include_raw": include_raw}
+        if after is None:
+            query = LIST_MODELS_FOR_USER_QUERY
+        else:
+            query = LIST_MODELS_FOR_USER_AFTER_QUERY
+            values["after_updated_at"], values["after_id"] = after
+        records = await self.db.fetch_all(query=query, values=values)
+
+        texts = await self._delta_texts(records[0:limit])
+        dmodels = []
+        for record in records[0:limit]:
+            dmodel = dict(record)
+            dmodel["raw"] = await self._model_raw(record, texts)
+            dmodel.pop("data", None)
+            dmodel.pop("base_hash", None)
+            dmodels.append(DModelMeta(**dmodel))
+        if len(records) <= limit:
+            return dmodels, None
+        last = dmodels[-1]
+        return dmodels, (last.updated_at, last.id)
+
+    async def get_last_model_for_user_id(self,
+                                         *,
+                                         user_id: int) -> DModelInDB:
+        dmodel = await self.db.fetch_one(
+            query=GET_LAST_MODEL_FOR_USER_ID_QUERY,
+            values={"user_id": user_id}
+        )
+
+        return await self._to_dmodel(dmodel)
 
-    async def get_last_model_for_users(self) -> DModelInDB:
+    async def get_last_model_for_users(self) -> List[DModelInDB]:
         dmodels = await self.db.fetch_all(
             query=GET_LAST_MODEL_FOR_ALL_USERS_QUERY,
             values={}
         )
 
-        # if dmodels:
-        #     return DModelInDB(**dmodel)
-        return dmodels
+        texts = await self._delta_texts(dmodels)
+        return [await self._to_dmodel(dmodel, texts) for dmodel in dmodels]
 
     async def delete_model_by_id(self,
                                  *,
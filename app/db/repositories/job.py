@@ -0,0 +1,99 @@
+from typing import List, Optional
+
+from app.db.repositories.base import BaseRepository
+from app.models.job import CodegenJobCreate, CodegenJobInDB, CodegenJobStatus
+
+
+CREATE_CODEGEN_JOB_QUERY = """
+    INSERT INTO codegen_jobs (user_id)
+    VALUES (:user_id)
+    RETURNING id, user_id, status, artifact_key, error, created_at, updated_at;
+"""
+
+GET_CODEGEN_JOB_BY_ID_QUERY = """
+    SELECT id, user_id, status, artifact_key, error, created_at, updated_at
+    FROM codegen_jobs
+    WHERE id = :id;
+"""
+
+UPDATE_CODEGEN_JOB_STATUS_QUERY = """
+    UPDATE codegen_jobs
+    SET status       = :status,
+        artifact_key = :artifact_key,
+        error        = :error
+    WHERE id = :id;
+"""
+
+# The update trigger sets updated_at
+TOUCH_CODEGEN_JOBS_QUERY = """
+    UPDATE codegen_jobs
+    SET status = status
+    WHERE id = ANY(:ids) AND status IN ('queued', 'running');
+"""
+
+FAIL_STALE_CODEGEN_JOBS_QUERY = """
+    UPDATE codegen_jobs
+    SET status = 'failed',
+        error  = :error
+    WHERE status IN ('queued', 'running')
+      AND updated_at < now() - make_interval(secs => :stale_after)
+    RETURNING id;
+"""
+
+
+class CodegenJobRepository(BaseRepository):
+    async def create_job(self,
+                         *,
+                         job_create: CodegenJobCreate) -> CodegenJobInDB:
+        job = await self.db.fetch_one(
+            query=CREATE_CODEGEN_JOB_QUERY,
+            values=job_create.dict()
+        )
+
+        return CodegenJobInDB(**job)
+
+    async def get_job_by_id(self,
+                            *,
+                            job_id: int) -> Optional[CodegenJobInDB]:
+        job = await self.db.fetch_one(
+            query=GET_CODEGEN_JOB_BY_ID_QUERY,
+            values={"id": job_id}
+        )
+
+        if not job:
+            return None
+
+        return CodegenJobInDB(**job)
+
+    async def set_job_status(self,
+                             *,
+                             job_id: int,
+                             status: CodegenJobStatus,
+                             artifact_key: Optional[str] = None,
+                             error: Optional[str] = None) -> None:
+        await self.db.execute(
+            query=UPDATE_CODEGEN_JOB_STATUS_QUERY,
+            values={
+                "id": job_id,
+                "status": status.value,
+                "artifact_key": artifact_key,
+                "error": error,
+            }
+        )
+
+    async def touch_jobs(self, *, job_ids: List[int]) -> None:
+        await self.db.execute(
+            query=TOUCH_CODEGEN_JOBS_QUERY,
+            values={"ids": job_ids}
+        )
+
+    async def fail_stale_jobs(self, *, stale_after: float, error: str) -> int:
+        """
+        Mark failed the unfinished jobs not updated for stale_after
+        seconds. Returns how many there were.
+        """
+        jobs = await self.db.fetch_all(
+            query=FAIL_STALE_CODEGEN_JOBS_QUERY,
+            values={"stale_after": float(stale_after), "error": error}
+        )
+        return len(jobs)
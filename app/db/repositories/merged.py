@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from databases import Database
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import engine_timer
+from app.db.repositories.base import BaseRepository
+from app.db.repositories.dmodel import DModelRepository
+from app.models.dmodel import DModelInDB
+from app.models.merged import MergedModelInDB
+from app.services.merge import extract_sections, merge_contributions
+
+
+GET_MERGED_MODEL_QUERY = """
+    SELECT raw, version, etag, updated_at
+    FROM merged_model
+    WHERE id = 1;
+"""
+
+INIT_MERGED_MODEL_QUERY = """
+    INSERT INTO merged_model (id)
+    VALUES (1)
+    ON CONFLICT (id) DO NOTHING;
+"""
+
+# Version the merged model must reach to reflect every committed
+# contribution
+GET_LATEST_VERSION_QUERY = """
+    SELECT last_value FROM merged_model_version_seq;
+"""
+
+BUMP_VERSION_QUERY = """
+    SELECT nextval('merged_model_version_seq');
+"""
+
+# Never let a slower merge overwrite a newer one
+UPDATE_MERGED_MODEL_QUERY = """
+    UPDATE merged_model
+    SET raw     = :raw,
+        etag    = :etag,
+        version = :version
+    WHERE id = 1 AND version < :version
+    RETURNING raw, version, etag, updated_at;
+"""
+
+GET_CONTRIBUTIONS_QUERY = """
+    SELECT sections
+    FROM merge_contributions
+    ORDER BY user_id;
+"""
+
+# Never let a slower request overwrite a newer model's contribution
+UPSERT_CONTRIBUTION_QUERY = """
+    INSERT INTO merge_contributions (user_id, model_id, model_updated_at, sections)
+    VALUES (:user_id, :model_id, :model_updated_at, :sections)
+    ON CONFLICT (user_id) DO UPDATE
+    SET model_id         = EXCLUDED.model_id,
+        model_updated_at = EXCLUDED.model_updated_at,
+        sections         = EXCLUDED.sections
+    WHERE merge_contributions.model_updated_at <= EXCLUDED.model_updated_at;
+"""
+
+DELETE_CONTRIBUTION_QUERY = """
+    DELETE FROM merge_contributions
+    WHERE user_id = :user_id;
+"""
+
+
+def make_contribution(dmodel: DModelInDB):
+    return {
+        "user_id": dmodel.user_id,
+        "model_id": dmodel.id,
+        "model_updated_at": dmodel.updated_at,
+        "sections": json.dumps(extract_sections(dmodel.raw)),
+    }
+
+
+def make_contributions(dmodels: List[DModelInDB]):
+    return [make_contribution(dmodel) for dmodel in dmodels]
+
+
+def merge_sections(contributions: List[str]) -> Tuple[str, str]:
+    """The merged model and its etag, from the JSON of every contribution"""
+    with engine_timer('merge'):
+        raw = merge_contributions(json.loads(c) for c in contributions) \
+            if contributions else ''
+    return raw, hashlib.sha256(raw.encode('utf8')).hexdigest()
+
+
+# One merge at a time per worker; readers that find the merged model stale
+# while a merge runs wait for it instead of merging again
+_merge_lock: Optional[asyncio.Lock] = None
+
+
+def merge_lock() -> asyncio.Lock:
+    global _merge_lock
+    if _merge_lock is None:
+        _merge_lock = asyncio.Lock()
+    return _merge_lock
+
+
+class MergedModelRepository(BaseRepository):
+    """
+    Lazily materialized merge of every user's latest model.
+
+    Each user's section contributions are kept in merge_contributions;
+    storing a model only re-extracts and writes that user's contribution,
+    then bumps merged_model_version_seq. Reading the merged model re-joins
+    the (already split) contributions into merged_model only when its
+    version is behind the sequence, so bursts of stores cost one merge on
+    the next read. No lock is held on merged_model across a merge.
+    """
+
+    def __init__(self, db: Database) -> None:
+        super().__init__(db)
+        self.dmodel_repo = DModelRepository(db)
+
+    async def get_merged_model(self) -> MergedModelInDB:
+        merged = await self.db.fetch_one(query=GET_MERGED_MODEL_QUERY)
+        if not merged:
+            return await self.rebuild()
+        latest = await self.db.fetch_val(query=GET_LATEST_VERSION_QUERY)
+        if merged["version"] >= latest:
+            return MergedModelInDB(**merged)
+
+        return await self._remerge()
+
+    async def rebuild(self) -> MergedModelInDB:
+        """
+        Create merged_model and recompute every user's contribution from
+        their latest model. Never replaces a newer contribution.
+        """
+        dmodels = await self.dmodel_repo.get_last_model_for_users()
+        contributions = await run_in_threadpool(make_contributions, dmodels)
+        async with self.db.transaction():
+            await self.db.execute(query=INIT_MERGED_MODEL_QUERY)
+            if contributions:
+                await self.db.execute_many(query=UPSERT_CONTRIBUTION_QUERY,
+                                           values=contributions)
+        await self.db.execute(query=BUMP_VERSION_QUERY)
+        return await self._remerge()
+
+    async def update_contribution(self,
+                                  *,
+                                  user_id: int,
+                                  dmodel: Optional[DModelInDB],
+                                  replace: bool = False) -> None:
+        """
+        Recompute the contribution of one user from ``dmodel``, their
+        latest model (None if they have none left). Unless ``replace`` is
+        set, an older model never replaces the contribution of a newer one.
+        The merged model itself is brought up to date on its next read.
+        """
+        contribution = None
+        if dmodel is not None:
+            contribution = await run_in_threadpool(make_contribution, dmodel)
+        async with self.db.transaction():
+            if dmodel is None or replace:
+                await self.db.execute(query=DELETE_CONTRIBUTION_QUERY,
+                                      values={"user_id": user_id})
+            if contribution is not None:
+                await self.db.execute(query=UPSERT_CONTRIBUTION_QUERY,
+                                      values=contribution)
+        # After the commit, so a reader that sees the new version also
+        # sees the contribution
+        await self.db.execute(query=BUMP_VERSION_QUERY)
+
+    async def _remerge(self) -> MergedModelInDB:
+        async with merge_lock():
+            merged = await self.db.fetch_one(query=GET_MERGED_MODEL_QUERY)
+            # Read before the contributions: the merge reflects at least
+            # every contribution committed by this version
+            latest = await self.db.fetch_val(query=GET_LATEST_VERSION_QUERY)
+            if merged["version"] >= latest:
+                return MergedModelInDB(**merged)
+            contributions = await self.db.fetch_all(query=GET_CONTRIBUTIONS_QUERY)
+            raw, etag = await run_in_threadpool(
+                merge_sections, [c["sections"] for c in contributions])
+            updated = await self.db.fetch_one(
+                query=UPDATE_MERGED_MODEL_QUERY,
+                values={"raw": raw, "etag": etag, "version": latest}
+            )
+        if updated:
+            return MergedModelInDB(**updated)
+        # Another worker stored a newer merge meanwhile
+        merged = await self.db.fetch_one(query=GET_MERGED_MODEL_QUERY)
+
+        return MergedModelInDB(**merged)
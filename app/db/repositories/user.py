@@ -106,7 +106,7 @@ class UserRepository(BaseRepository):
                 detail="That username is already taken. Please try another one.",
             )
 
-        user_password_update = self.auth_service.create_salt_and_hashed_password(
+        user_password_update = await self.auth_service.create_salt_and_hashed_password_async(
             plaintext_password=new_user.password)
         new_user_params = new_user.copy(update=user_password_update.dict())
         created_user = await self.db.fetch_one(
@@ -128,9 +128,10 @@ class UserRepository(BaseRepository):
         if not user:
             return None
 
-        if not self.auth_service.verify_password(password=password,
-                                                 salt=user.salt,
-                                                 hashed_pw=user.password):
+        if not await self.auth_service.verify_password_async(
+                password=password,
+                salt=user.salt,
+                hashed_pw=user.password):
             return None
 
         return user
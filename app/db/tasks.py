@@ -1,7 +1,14 @@
+import asyncio
 import os
 from fastapi import FastAPI
 from databases import Database
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_URL,
+    MODEL_COMPACTION_INTERVAL,
+    MODEL_DELTA_MAX_CHAIN,
+)
+from app.core.metrics import instrument_database
+from app.db.repositories.dmodel import DModelRepository
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +20,7 @@ async def connect_to_db(app: FastAPI) -> None:
 
     try:
         await database.connect()
+        instrument_database(database)
         app.state._db = database
         logger.warn(f"Connected to Postgres -> {DB_URL}")
     except Exception as e:
@@ -29,3 +37,33 @@ async def close_db_connection(app: FastAPI) -> None:
         logger.warn(e)
         logger.warn("--- DB DISCONNECT ERROR ---")
 
+
+async def compact_model_chains(app: FastAPI) -> None:
+    """Periodically re-snapshot model delta chains that grew too long"""
+    # Blobs whose chain can't be rebuilt are left alone from then on, so
+    # they don't hold back the others
+    broken = set()
+    while True:
+        await asyncio.sleep(MODEL_COMPACTION_INTERVAL)
+        try:
+            compacted, failed = await DModelRepository(app.state._db).compact_model_chains(
+                max_depth=MODEL_DELTA_MAX_CHAIN, skip=broken)
+            if compacted:
+                logger.warning(f"Compacted {compacted} model delta chains")
+            for m_hash in failed:
+                logger.warning(f"Can't rebuild model blob {m_hash}, not compacting it")
+            broken.update(failed)
+        except Exception as e:
+            logger.warning(f"Model delta compaction failed: {e}")
+
+
+def start_model_compaction(app: FastAPI) -> None:
+    app.state._compaction = asyncio.get_event_loop().create_task(
+        compact_model_chains(app))
+
+
+def stop_model_compaction(app: FastAPI) -> None:
+    task = getattr(app.state, "_compaction", None)
+    if task is not None:
+        task.cancel()
+        app.state._compaction = None
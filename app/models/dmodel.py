@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import List, Optional
 
 from app.models.core import DateTimeModelMixin, IDModelMixin, CoreModel
 
@@ -13,7 +14,24 @@ class DModelInsert(DModelBase):
 
 class DModelInDB(IDModelMixin, DateTimeModelMixin, DModelBase):
     user_id: int
+    content_hash: Optional[str]
 
 
 class DModelPublic(DModelInDB):
     pass
+
+
+class DModelMeta(IDModelMixin, DateTimeModelMixin, CoreModel):
+    """
+    A stored model version without its text, unless asked for
+    """
+
+    user_id: int
+    content_hash: Optional[str]
+    size: Optional[int]
+    raw: Optional[str]
+
+
+class DModelPage(CoreModel):
+    items: List[DModelMeta]
+    next_cursor: Optional[str]
@@ -0,0 +1,29 @@
+from enum import Enum
+from typing import Optional
+
+from app.models.core import DateTimeModelMixin, IDModelMixin, CoreModel
+
+
+class CodegenJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class CodegenJobBase(CoreModel):
+    status: CodegenJobStatus = CodegenJobStatus.queued
+    error: Optional[str]
+
+
+class CodegenJobCreate(CoreModel):
+    user_id: int
+
+
+class CodegenJobInDB(IDModelMixin, DateTimeModelMixin, CodegenJobBase):
+    user_id: int
+    artifact_key: Optional[str]
+
+
+class CodegenJobPublic(IDModelMixin, DateTimeModelMixin, CodegenJobBase):
+    pass
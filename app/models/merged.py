@@ -0,0 +1,11 @@
+from datetime import datetime
+from typing import Optional
+
+from app.models.core import CoreModel
+
+
+class MergedModelInDB(CoreModel):
+    raw: str
+    version: int
+    etag: str
+    updated_at: Optional[datetime]
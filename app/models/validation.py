@@ -0,0 +1,25 @@
+from typing import List
+
+from app.models.core import CoreModel
+
+
+class ValidationBatchItem(CoreModel):
+    name: str
+    raw: str
+
+
+class ValidationBatch(CoreModel):
+    models: List[ValidationBatchItem]
+
+
+class ValidationResult(CoreModel):
+    index: int
+    name: str
+    status: int
+    message: str = ''
+    elapsed_ms: float
+
+
+class ValidationBatchResult(CoreModel):
+    results: List[ValidationResult]
+    elapsed_ms: float
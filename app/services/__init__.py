@@ -1,5 +1,19 @@
+from app.core.config import (
+    CODEGEN_JOBS_MAX_RUNNING,
+    CODEGEN_JOBS_MAX_PENDING,
+    CODEGEN_JOBS_MAX_RETRIES,
+    DSL_RETRY_AFTER
+)
 from app.services.authentication import AuthService
 from app.services.dflow import DflowService
+from app.services.jobs import CodegenJobRunner
 
 auth_service = AuthService()
 dflow_service = DflowService()
+codegen_job_runner = CodegenJobRunner(
+    dflow_service,
+    max_running=CODEGEN_JOBS_MAX_RUNNING,
+    max_pending=CODEGEN_JOBS_MAX_PENDING,
+    max_retries=CODEGEN_JOBS_MAX_RETRIES,
+    retry_after=DSL_RETRY_AFTER
+)
@@ -0,0 +1,207 @@
+import gzip
+import logging
+import os
+import stat
+import tarfile
+import uuid
+from typing import Iterator, Optional
+
+from app.services.cache import content_key, dflow_version
+
+
+logger = logging.getLogger(__name__)
+
+
+def reproducible_tarinfo(tar: tarfile.TarFile,
+                         path: str,
+                         arcname: str) -> tarfile.TarInfo:
+    """
+    TarInfo for ``path`` with everything that depends on when or by whom
+    the file was written stripped out.
+    """
+    info = tar.gettarinfo(path, arcname=arcname)
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    if info.isdir() or info.mode & stat.S_IXUSR:
+        info.mode = 0o755
+    else:
+        info.mode = 0o644
+    return info
+
+
+def iter_tree(source_dir: str, arcname: str):
+    """
+    Yield (path, arcname) for ``source_dir`` and everything below it,
+    in a stable order.
+    """
+    yield source_dir, arcname
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        rel = os.path.relpath(root, source_dir)
+        prefix = arcname if rel == '.' else os.path.join(arcname, rel)
+        entries = sorted(dirs + files)
+        for name in entries:
+            yield os.path.join(root, name), os.path.join(prefix, name)
+
+
+class _ChunkSink:
+    """
+    Write-only file object that buffers what the gzip stream produces,
+    so it can be handed out chunk by chunk.
+    """
+
+    def __init__(self) -> None:
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def iter_tarball(source_dir: str,
+                 arcname: str,
+                 chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Produce ``source_dir`` as a tar.gz, incrementally. The output is
+    byte-identical for identical trees: sorted entries, zeroed
+    mtimes/owners and a gzip header without file name or timestamp.
+    """
+    sink = _ChunkSink()
+    with gzip.GzipFile(filename='', mode='wb', fileobj=sink, mtime=0) as gz:
+        with tarfile.open(fileobj=gz, mode='w',
+                          format=tarfile.GNU_FORMAT) as tar:
+            for path, name in iter_tree(source_dir, arcname):
+                info = reproducible_tarinfo(tar, path, name)
+                if info.isreg():
+                    with open(path, 'rb') as f:
+                        tar.addfile(info, f)
+                else:
+                    tar.addfile(info)
+                if sink.size >= chunk_size:
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def make_reproducible_tarball(fout: str, source_dir: str, arcname: str) -> None:
+    with open(fout, 'wb') as f:
+        for chunk in iter_tarball(source_dir, arcname):
+            f.write(chunk)
+
+
+def iter_file(path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of generated code tarballs.
+
+    Artifacts are named after the hash of the model they were generated
+    from (salted with the dflow version), so a repeated codegen request is
+    served from disk without parsing or generating anything. The total
+    size is capped at ``max_bytes``; least recently used artifacts are
+    evicted first (file mtime doubles as the access time). The store is a
+    plain directory, so every worker of the container shares it. A
+    ``max_bytes`` of 0 disables it.
+    """
+
+    SUFFIX = '.tar.gz'
+
+    def __init__(self, *, root: str, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.salt = dflow_version()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, model: bytes) -> str:
+        return content_key(model, self.salt)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f'{key}{self.SUFFIX}')
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def tmp_path(self, key: str) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        return os.path.join(self.root,
+                            f'.{key}-{uuid.uuid4().hex[0:8]}.tmp')
+
+    def put(self, key: str, tarball_path: str) -> str:
+        """
+        Move a finished tarball into the store. Concurrent puts of the same
+        key are harmless since both tarballs are byte-identical.
+        """
+        path = self.path(key)
+        os.replace(tarball_path, path)
+        self.evict()
+        return path
+
+    def tee(self, key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """
+        Pass ``chunks`` through while also writing them to the store. The
+        artifact is only committed once the stream completes.
+        """
+        if not self.enabled:
+            yield from chunks
+            return
+        tmp_path = self.tmp_path(key)
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            self.put(key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,4 +1,8 @@
-from typing import Optional, Type
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Type
 
 import jwt
 import bcrypt
@@ -10,9 +14,13 @@ from pydantic import ValidationError
 
 
 from app.core.config import SECRET_KEY, JWT_ALGORITHM, JWT_AUDIENCE, JWT_TOKEN_PREFIX, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.config import AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES
+from app.core.config import PASSWORD_HASH_THREADS, PASSWORD_HASH_MAX_WAITING
+from app.core.metrics import PASSWORD_HASH_IN_FLIGHT, PASSWORD_HASH_REJECTED, PASSWORD_HASH_WAIT
 from app.models.token import JWTMeta, JWTCreds, JWTPayload
 from app.models.user import UserPasswordUpdate, UserInDB
 from app.models.user import UserBase, UserPasswordUpdate
+from app.services.cache import LRUCache
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -23,6 +31,69 @@ class AuthException(BaseException):
 
 
 class AuthService:
+    def __init__(self) -> None:
+        # token subject (username) -> UserInDB, without profile. Nothing
+        # invalidates entries: a change to a user (e.g. deactivation) takes
+        # effect in each worker only once its entry expires, within
+        # AUTH_CACHE_TTL seconds.
+        self.user_cache = LRUCache(max_entries=AUTH_CACHE_MAX_ENTRIES,
+                                   ttl=AUTH_CACHE_TTL)
+        # bcrypt runs on its own small pool so that a burst of logins
+        # neither blocks the event loop nor starves the default pool
+        self._hash_pool = ThreadPoolExecutor(
+            max_workers=PASSWORD_HASH_THREADS,
+            thread_name_prefix='password-hash')
+        self._hash_slots: Optional[asyncio.Semaphore] = None
+        self._hash_waiting = 0
+
+    async def _run_password_job(self, fn: Callable, **kwargs):
+        """
+        Run a bcrypt call on the password hashing pool. At most
+        PASSWORD_HASH_THREADS run at once; beyond PASSWORD_HASH_MAX_WAITING
+        queued calls, new ones are turned away with a 503.
+        """
+        if self._hash_waiting >= PASSWORD_HASH_MAX_WAITING:
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins. Please retry later.",
+                headers={"Retry-After": "1"},
+            )
+        if self._hash_slots is None:
+            self._hash_slots = asyncio.Semaphore(PASSWORD_HASH_THREADS)
+        t0 = time.perf_counter()
+        self._hash_waiting += 1
+        PASSWORD_HASH_IN_FLIGHT.inc()
+        try:
+            await self._hash_slots.acquire()
+        except BaseException:
+            PASSWORD_HASH_IN_FLIGHT.dec()
+            raise
+        finally:
+            self._hash_waiting -= 1
+        try:
+            PASSWORD_HASH_WAIT.observe(time.perf_counter() - t0)
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self._hash_pool, functools.partial(fn, **kwargs))
+        finally:
+            self._hash_slots.release()
+            PASSWORD_HASH_IN_FLIGHT.dec()
+
+    async def create_salt_and_hashed_password_async(
+        self,
+        *,
+        plaintext_password: str
+    ) -> UserPasswordUpdate:
+        return await self._run_password_job(
+            self.create_salt_and_hashed_password,
+            plaintext_password=plaintext_password)
+
+    async def verify_password_async(self, *, password: str, salt: str, hashed_pw: str) -> bool:
+        return await self._run_password_job(
+            self.verify_password,
+            password=password, salt=salt, hashed_pw=hashed_pw)
+
     def create_salt_and_hashed_password(
         self,
         *,
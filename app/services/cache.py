@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # pragma: no cover
+    from importlib_metadata import version, PackageNotFoundError
+
+
+logger = logging.getLogger(__name__)
+
+
+def dflow_version() -> str:
+    try:
+        return version('dflow')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def content_key(model: bytes, salt: str = '') -> str:
+    """
+    Content address of a model: sha256 over the model bytes, salted with
+    e.g. the dflow version so results never outlive a language change.
+    """
+    h = hashlib.sha256(salt.encode('utf8'))
+    h.update(b'\0')
+    h.update(model)
+    return h.hexdigest()
+
+
+CREATE_VALIDATION_TABLE = """
+    CREATE TABLE IF NOT EXISTS validation (
+        key TEXT PRIMARY KEY,
+        ok INTEGER NOT NULL,
+        message TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    )
+"""
+
+CREATE_VALIDATION_INDEX = """
+    CREATE INDEX IF NOT EXISTS ix_validation_accessed_at
+    ON validation (accessed_at)
+"""
+
+GET_VALIDATION_QUERY = """
+    SELECT ok, message, created_at, accessed_at
+    FROM validation
+    WHERE key = ?
+"""
+
+TOUCH_VALIDATION_QUERY = """
+    UPDATE validation SET accessed_at = ? WHERE key = ?
+"""
+
+PUT_VALIDATION_QUERY = """
+    INSERT OR REPLACE INTO validation (key, ok, message, created_at, accessed_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+DELETE_VALIDATION_QUERY = """
+    DELETE FROM validation WHERE key = ?
+"""
+
+EVICT_EXPIRED_QUERY = """
+    DELETE FROM validation WHERE created_at < ?
+"""
+
+COUNT_VALIDATION_QUERY = """
+    SELECT count(*) FROM validation
+"""
+
+EVICT_LRU_QUERY = """
+    DELETE FROM validation
+    WHERE key IN (
+        SELECT key FROM validation
+        ORDER BY accessed_at
+        LIMIT max(0, (SELECT count(*) FROM validation) - ?)
+    )
+"""
+
+
+class ValidationCache:
+    """
+    Validation results (pass/fail + error message) keyed by model content.
+
+    Backed by a local sqlite file so that every uvicorn worker of the
+    container shares the same entries. Entries expire after ``ttl`` seconds
+    and the least recently used ones are evicted beyond ``max_entries``.
+    Each worker counts its own puts against the last known size, and
+    evicts down to EVICT_LOW_WATER of ``max_entries`` once over, so the
+    table may briefly run over by what other workers added. The cache is
+    best effort: any sqlite error is logged and treated as a miss. A
+    ``max_entries`` of 0 disables it.
+
+    Calls block on sqlite; run them in the threadpool.
+    """
+
+    # Don't write back the access time on every hit
+    TOUCH_INTERVAL = 60
+    EVICT_LOW_WATER = 0.9
+
+    def __init__(self, *, path: str, max_entries: int, ttl: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.salt = dflow_version()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        # The connection is shared by the threads of the worker
+        self._lock = threading.Lock()
+        self._count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared across a fork
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=1,
+                               isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(CREATE_VALIDATION_TABLE)
+        conn.execute(CREATE_VALIDATION_INDEX)
+        self._count = conn.execute(COUNT_VALIDATION_QUERY).fetchone()[0]
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def key(self, model: bytes) -> str:
+        return content_key(model, self.salt)
+
+    def get(self, key: str) -> Optional[Tuple[bool, str]]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                return self._get(key, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Validation cache read failed: {e}")
+            return None
+
+    def _get(self, key: str, now: float) -> Optional[Tuple[bool, str]]:
+        conn = self._connect()
+        row = conn.execute(GET_VALIDATION_QUERY, (key,)).fetchone()
+        if row is None:
+            return None
+        ok, message, created_at, accessed_at = row
+        if now - created_at > self.ttl:
+            conn.execute(DELETE_VALIDATION_QUERY, (key,))
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL:
+            conn.execute(TOUCH_VALIDATION_QUERY, (now, key))
+        return bool(ok), message
+
+    def put(self, key: str, ok: bool, message: str = '') -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(PUT_VALIDATION_QUERY,
+                             (key, int(ok), message, now, now))
+                self._count += 1
+                if self._count > self.max_entries:
+                    conn.execute(EVICT_EXPIRED_QUERY, (now - self.ttl,))
+                    conn.execute(EVICT_LRU_QUERY,
+                                 (int(self.max_entries * self.EVICT_LOW_WATER),))
+                    self._count = conn.execute(
+                        COUNT_VALIDATION_QUERY).fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Validation cache write failed: {e}")
+
+
+class LRUCache:
+    """
+    Small in-process LRU map with an optional time to live. Each worker
+    has its own; use it for data that may be briefly stale. With
+    ``max_bytes``, the total ``sizeof`` of the values is bounded as well.
+    """
+
+    def __init__(self,
+                 *,
+                 max_entries: int,
+                 ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = len) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.size = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, value, _ = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            self.invalidate(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        self.invalidate(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._data[key] = (time.monotonic(), value, size)
+        self.size += size
+        while len(self._data) > self.max_entries or \
+                (self.max_bytes is not None and self.size > self.max_bytes):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.size -= evicted
+
+    def invalidate(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
@@ -0,0 +1,53 @@
+import json
+import zlib
+from difflib import SequenceMatcher
+from typing import List, Optional, Union
+
+# A delta is a list of ops applied to the lines of a base text: [i, j]
+# copies base lines i..j, a string is inserted as is.
+Delta = List[Union[List[int], str]]
+
+
+def make_delta(base: str,
+               target: str,
+               max_lines: Optional[int] = None,
+               min_ratio: float = 0.0) -> Optional[Delta]:
+    """
+    The delta from base to target. Matching is quadratic in the worst
+    case, so None is returned instead when either text has more than
+    max_lines lines or the texts share less than min_ratio of their lines.
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    if max_lines is not None and \
+            max(len(base_lines), len(target_lines)) > max_lines:
+        return None
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    if min_ratio and matcher.quick_ratio() < min_ratio:
+        return None
+    delta: Delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(''.join(target_lines[j1:j2]))
+    return delta
+
+
+def apply_delta(base: str, delta: Delta) -> str:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def encode_delta(delta: Delta) -> bytes:
+    return zlib.compress(json.dumps(delta, separators=(',', ':')).encode('utf8'))
+
+
+def decode_delta(data: bytes) -> Delta:
+    return json.loads(zlib.decompress(data).decode('utf8'))
@@ -1,17 +1,85 @@
+import asyncio
+import glob
+import logging
 import subprocess
-import tarfile
-import uuid
+import threading
+import time
 import os
-from typing import List, Any
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
 
-from dflow.utils import build_model
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+import dflow
+from dflow.utils import get_mm
 from dflow.generator import codegen
 
+from app.core.config import (
+    DSL_POOL_SIZE,
+    DSL_MAX_QUEUE,
+    DSL_RETRY_AFTER,
+    CACHE_DIR,
+    VALIDATION_CACHE_MAX_ENTRIES,
+    VALIDATION_CACHE_TTL,
+    ARTIFACT_STORE_MAX_BYTES,
+    SCRATCH_MAX_AGE,
+    SCRATCH_MAX_BYTES,
+    SCRATCH_SWEEP_INTERVAL,
+    METAMODEL_CHECK_INTERVAL
+)
+from app.core.metrics import SCRATCH_BYTES, SCRATCH_FILES, engine_timer
+from app.services.artifacts import (
+    ArtifactStore,
+    iter_file,
+    iter_tarball,
+    make_reproducible_tarball
+)
+from app.services.cache import ValidationCache, dflow_version
+from app.services.executor import DslExecutor
+from app.services.scratch import ScratchSpace
+
+
+logger = logging.getLogger(__name__)
+
 
 class Dflow(BaseException):
     pass
 
 
+class DflowException(Exception):
+    """
+    Raised when a model fails to validate or generate. Carries only the
+    message, so it can cross the process pool boundary.
+    """
+    pass
+
+
+# Seconds the DSL pool process initializer took to build the metamodel
+_metamodel_build_time: Optional[float] = None
+
+
+def _init_worker():
+    # DSL pool process initializer: build the metamodel once per process.
+    # DflowService.start warms up every process, so this happens at
+    # startup rather than on the first job.
+    global _metamodel_build_time
+    from app.services import dflow_service
+    _metamodel_build_time = dflow_service.load_metamodel()
+
+
+def _metamodel_build_time_in_worker() -> Optional[float]:
+    return _metamodel_build_time
+
+
+def _call_in_worker(method: str, *args):
+    # Runs inside a DSL pool process, against that process' service instance
+    from app.services import dflow_service
+    try:
+        return getattr(dflow_service, method)(*args)
+    except Exception as e:
+        raise DflowException(str(e)) from None
+
+
 class DflowService:
     TMP_DIR = '/tmp/dflow'
 
@@ -21,135 +89,265 @@ class DflowService:
                 os.mkdir(DflowService.TMP_DIR)
             except Exception:
                 pass
+        self.executor = DslExecutor(
+            pool_size=DSL_POOL_SIZE,
+            max_queue=DSL_MAX_QUEUE,
+            retry_after=DSL_RETRY_AFTER,
+            initializer=_init_worker
+        )
+        self.validation_cache = ValidationCache(
+            path=os.path.join(CACHE_DIR, 'validation.sqlite'),
+            max_entries=VALIDATION_CACHE_MAX_ENTRIES,
+            ttl=VALIDATION_CACHE_TTL
+        )
+        self.artifacts = ArtifactStore(
+            root=os.path.join(CACHE_DIR, 'artifacts'),
+            max_bytes=ARTIFACT_STORE_MAX_BYTES
+        )
+        self.scratch = ScratchSpace(
+            root=DflowService.TMP_DIR,
+            max_age=SCRATCH_MAX_AGE,
+            max_bytes=SCRATCH_MAX_BYTES
+        )
+        self._janitor = None
+        self._metamodel = None
+        self._metamodel_fingerprint = None
+        self._metamodel_checked = 0.0
+        self._metamodel_lock = threading.Lock()
+
+    async def start(self):
+        t0 = time.perf_counter()
+        workers = await self.executor.warm_up(_metamodel_build_time_in_worker)
+        if workers:
+            build_times = [t for t in workers.values() if t is not None]
+            logger.warning(
+                f"Started {len(workers)} DSL pool processes in "
+                f"{time.perf_counter() - t0:.3f}s, metamodel built in "
+                f"{max(build_times, default=0.0):.3f}s")
+        self._janitor = asyncio.get_event_loop().create_task(
+            self.run_janitor())
+
+    def shutdown(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            self._janitor = None
+        self._metamodel = None
+        self._metamodel_fingerprint = None
+        self._metamodel_checked = 0.0
+        self._metamodel_lock = threading.Lock()
+        self.executor.shutdown()
+
+    async def run_janitor(self):
+        while True:
+            try:
+                await run_in_threadpool(self.scratch.sweep)
+                stats = self.scratch.stats()
+                SCRATCH_BYTES.set(stats['held_bytes'])
+                SCRATCH_FILES.set(stats['held_files'])
+            except Exception as e:
+                logger.warning(f"Scratch space sweep failed: {e}")
+            await asyncio.sleep(SCRATCH_SWEEP_INTERVAL)
+
+    async def validate(self, model: bytes):
+        key = self.validation_cache.key(model)
+        cached = await run_in_threadpool(self.validation_cache.get, key)
+        if cached is not None:
+            ok, message = cached
+            if not ok:
+                raise DflowException(message)
+            return
+        try:
+            await self.executor.run(_call_in_worker, 'validate_model_b64',
+                                    model)
+        except DflowException as e:
+            await run_in_threadpool(self.validation_cache.put, key, False, str(e))
+            raise
+        await run_in_threadpool(self.validation_cache.put, key, True)
+
+    async def validate_batch(
+            self, models: List[Tuple[str, bytes]]) -> AsyncIterator[Dict]:
+        """
+        Validate many models concurrently, as many at a time as the DSL
+        pool has processes. Yields one result per model, in completion
+        order.
+        """
+        semaphore = asyncio.Semaphore(max(self.executor.pool_size, 1))
+
+        async def validate_one(index: int, name: str, model: bytes) -> Dict:
+            async with semaphore:
+                t0 = time.perf_counter()
+                status, message = 200, ''
+                try:
+                    await self.validate(model)
+                except HTTPException as e:
+                    status, message = e.status_code, str(e.detail)
+                except Exception as e:
+                    status, message = 404, str(e)
+                return {
+                    'index': index,
+                    'name': name,
+                    'status': status,
+                    'message': message,
+                    'elapsed_ms': (time.perf_counter() - t0) * 1000,
+                }
+
+        loop = asyncio.get_event_loop()
+        tasks = [loop.create_task(validate_one(i, name, model))
+                 for i, (name, model) in enumerate(models)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # e.g. the client went away halfway through a streamed batch
+            for task in tasks:
+                task.cancel()
+
+    async def codegen_stream(self, model: bytes) -> Tuple[Iterator[bytes], str]:
+        """
+        Streaming flavour of codegen: returns the tar.gz as an iterator of
+        chunks, produced while it is sent, plus its file name. Only the
+        generated tree touches the disk, and it is removed once streamed.
+        """
+        key = self.artifacts.key(model)
+        filename = f'{key}{ArtifactStore.SUFFIX}'
+        tarball_path = self.artifacts.get(key)
+        if tarball_path is not None:
+            return iter_file(tarball_path), filename
+        workdir, out_dir = await self.executor.run(
+            _call_in_worker, 'generate_tree', model)
+        return self.stream_tree(key, workdir, out_dir), filename
+
+    async def codegen(self, model: bytes) -> str:
+        tarball_path = self.artifacts.get(self.artifacts.key(model))
+        if tarball_path is not None:
+            return tarball_path
+        return await self.executor.run(_call_in_worker, 'generate_b64', model)
 
     def validate_model(self, fd):
-        u_id = uuid.uuid4().hex[0:8]
-        fpath = os.path.join(
-            DflowService.TMP_DIR,
-            f'model_for_validation-{u_id}.dflow'
-        )
-        with open(fpath, 'w') as f:
-            f.write(fd.read().decode('utf8'))
-        model, _ = build_model(fpath)
+        return self.validate_model_b64(fd.read())
 
     def validate_model_b64(self, model_b64):
-        u_id = uuid.uuid4().hex[0:8]
-        fpath = os.path.join(
-            DflowService.TMP_DIR,
-            f'model_for_validation-{u_id}.dflow'
-        )
-        with open(fpath, 'wb') as f:
-            f.write(model_b64)
-        model, _ = build_model(fpath)
+        model = self.parse_model(model_b64)
+
+    def parse_model(self, model_raw: Union[str, bytes]):
+        """
+        Build the model straight from its text, without the temp file
+        round trip of build_model. Imports are resolved relative to the
+        working directory.
+        """
+        if isinstance(model_raw, bytes):
+            model_raw = model_raw.decode('utf8')
+        metamodel = self.metamodel()
+        with engine_timer('build_model'):
+            return metamodel.model_from_str(model_raw)
+
+    def metamodel_fingerprint(self) -> str:
+        """
+        Identifies the grammar the metamodel is built from: the dflow
+        version plus name, size and mtime of every grammar file.
+        """
+        parts = [dflow_version()]
+        root = os.path.dirname(dflow.__file__)
+        for path in sorted(glob.glob(os.path.join(root, '**', '*.tx'),
+                                     recursive=True)):
+            st = os.stat(path)
+            parts.append(f'{os.path.relpath(path, root)}:{st.st_size}:{st.st_mtime_ns}')
+        return '|'.join(parts)
+
+    def load_metamodel(self, fingerprint: Optional[str] = None) -> float:
+        """
+        (Re)build the dflow metamodel. Returns the time it took, in seconds.
+        """
+        if fingerprint is None:
+            fingerprint = self.metamodel_fingerprint()
+        t0 = time.perf_counter()
+        mm = get_mm(global_scope=True)
+        elapsed = time.perf_counter() - t0
+        with self._metamodel_lock:
+            self._metamodel = mm
+            self._metamodel_fingerprint = fingerprint
+            self._metamodel_checked = time.monotonic()
+        return elapsed
+
+    def metamodel(self):
+        """
+        The metamodel shared by every parse in this process. Built on first
+        use and rebuilt if the grammar changed, which is checked at most
+        every METAMODEL_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if self._metamodel is not None and \
+                now - self._metamodel_checked < METAMODEL_CHECK_INTERVAL:
+            return self._metamodel
+        with self._metamodel_lock:
+            if self._metamodel is not None and \
+                    now - self._metamodel_checked < METAMODEL_CHECK_INTERVAL:
+                return self._metamodel
+            fingerprint = self.metamodel_fingerprint()
+            self._metamodel_checked = now
+            if self._metamodel is not None and \
+                    fingerprint == self._metamodel_fingerprint:
+                return self._metamodel
+        elapsed = self.load_metamodel(fingerprint)
+        logger.warning(f"dflow metamodel (re)built in {elapsed:.3f}s")
+        return self._metamodel
 
     def run_subprocess(self, exec_path):
         pid = subprocess.Popen(['python3', exec_path], close_fds=True)
         return pid
 
-    def make_tarball(self, fout, source_dir):
-        with tarfile.open(fout, "w:gz") as tar:
-            tar.add(source_dir, arcname=os.path.basename(source_dir))
+    def make_tarball(self, fout, source_dir, arcname=None):
+        if arcname is None:
+            arcname = os.path.basename(source_dir)
+        with engine_timer('make_tarball'):
+            make_reproducible_tarball(fout, source_dir, arcname)
 
     def generate(self, fd):
-        u_id = uuid.uuid4().hex[0:8]
-        model_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'model-{u_id}.dflow'
-        )
-        tarball_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'{u_id}.tar.gz'
-        )
-        gen_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'gen-{u_id}'
-        )
-        with open(model_path, 'w') as f:
-            f.write(fd.read().decode('utf8'))
-        out_dir = codegen(model_path, output_path=gen_path)
-        self.make_tarball(tarball_path, out_dir)
-        return tarball_path
+        return self.generate_b64(fd.read())
+
+    def generate_tree(self, model_b64):
+        """
+        Run codegen for the model in a fresh working directory; returns the
+        working directory and the directory holding the generated tree.
+        """
+        workdir = self.scratch.workdir()
+        try:
+            model_path = os.path.join(workdir, 'model.dflow')
+            with open(model_path, 'wb') as f:
+                f.write(model_b64)
+            with engine_timer('codegen'):
+                out_dir = codegen(model_path,
+                                  output_path=os.path.join(workdir, 'gen'))
+        except Exception:
+            self.scratch.release(workdir)
+            raise
+        return workdir, out_dir
 
     def generate_b64(self, model_b64):
-        u_id = uuid.uuid4().hex[0:8]
-        model_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'model-{u_id}.dflow'
-        )
-        tarball_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'{u_id}.tar.gz'
-        )
-        gen_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'gen-{u_id}'
-        )
-        with open(model_path, 'wb') as f:
-            f.write(model_b64)
-        out_dir = codegen(model_path, output_path=gen_path)
-        self.make_tarball(tarball_path, out_dir)
-        return tarball_path
-
-    def unpack_model_from_file(self, fd):
-        return fd.read().decode('utf8')
-
-    def store_model_file_tmp(self, model_raw, model_id):
-        gen_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'dmodel-{model_id}.dflow'
-        )
-        with open(gen_path, 'w') as f:
-            f.write(model_raw)
-        return gen_path
-
-    def merge(self, models: List[Any]):
-        sections = [
-            'entities',
-            'synonyms',
-            'gslots',
-            'triggers',
-            'dialogues',
-            'eservices'
-        ]
-        merged_strings = {k: '' for k in sections}
-
-        for model in models:
-            data = model.raw
-            # Use list os sections to find keywords in file
-            indexes = []
-            for section in sections:
-                i = data.find(section)
-                indexes.append(i)
-            # Sort sections based on appearance in file
-            indexes, sections = zip(*sorted(zip(indexes, sections)))
-
-            # Extract each section in reverse order
-            for i in reversed(range(len(indexes))):
-                ind = indexes[i]
-                # ind == -1 if keyword doesn't exist in data
-                if ind >= 0:
-                    part = data[ind:]
-                    data = data[:ind]
-                    end_i = part.rfind('end')
-                    merged_strings[sections[i]] += part[len(sections[i]):end_i]
-
-        # Add section name the begining and 'end' in the end of each section
-        for section in merged_strings:
-            merged_strings[section] = section + merged_strings[section] + '\nend'
-        merged_str = '\n\n'.join([
-            merged_strings['gslots'],
-            merged_strings['entities'],
-            merged_strings['synonyms'],
-            merged_strings['triggers'],
-            merged_strings['eservices'],
-            merged_strings['dialogues'],
-        ])
-
-        u_id = uuid.uuid4().hex[0:8]
-        gen_path = os.path.join(
-            DflowService.TMP_DIR,
-            f'model-merged-{u_id}.dflow'
-        )
-        with open(gen_path, 'w') as f:
-            f.write(merged_str)
-        return gen_path
+        key = self.artifacts.key(model_b64)
+        tarball_path = self.artifacts.get(key)
+        if tarball_path is not None:
+            return tarball_path
+
+        workdir, out_dir = self.generate_tree(model_b64)
+        # The archive root is named after the content, not the request,
+        # so that identical models give byte-identical tarballs
+        arcname = f'gen-{key[0:8]}'
+        if not self.artifacts.enabled:
+            # Released by the route once the response is sent
+            tarball_path = os.path.join(workdir, f'{key[0:8]}.tar.gz')
+            self.make_tarball(tarball_path, out_dir, arcname)
+            return tarball_path
+        try:
+            tmp_path = self.artifacts.tmp_path(key)
+            self.make_tarball(tmp_path, out_dir, arcname)
+            return self.artifacts.put(key, tmp_path)
+        finally:
+            self.scratch.release(workdir)
+
+    def stream_tree(self, key, workdir, out_dir):
+        try:
+            chunks = iter_tarball(out_dir, f'gen-{key[0:8]}')
+            yield from self.artifacts.tee(key, chunks)
+        finally:
+            self.scratch.release(workdir)
@@ -0,0 +1,128 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds a warm-up call keeps its pool process busy
+WARM_UP_HOLD = 0.05
+
+
+def _warm_up(fn: Callable) -> Tuple[int, Any]:
+    time.sleep(WARM_UP_HOLD)
+    return os.getpid(), fn()
+
+
+class DslExecutor:
+    """
+    Runs CPU-bound DSL work (textX parsing, codegen) in a process pool so
+    that it never blocks the event loop of the API worker.
+
+    At most ``pool_size + max_queue`` calls may be in flight per API worker;
+    anything beyond that is rejected with a 503 and a Retry-After header.
+    A ``pool_size`` of 0 runs the work on the default thread pool instead.
+    """
+
+    def __init__(self,
+                 *,
+                 pool_size: int,
+                 max_queue: int,
+                 retry_after: int,
+                 initializer: Optional[Callable] = None) -> None:
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.initializer = initializer
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.pool_size, 1) + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        if self._pool is not None or self.pool_size <= 0:
+            return
+        # spawn: forking a process that already runs an event loop and a
+        # db connection pool is not safe
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.pool_size,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=self.initializer
+        )
+
+    async def warm_up(self, fn: Callable, timeout: float = 120) -> Dict[int, Any]:
+        """
+        Start the pool and wait until every pool process has been spawned,
+        initialized and has run ``fn``; returns the result of ``fn`` by
+        process id. ProcessPoolExecutor only spawns processes when work
+        arrives, so without this the first calls pay for it. Raises
+        RuntimeError if the processes fail to start, e.g. because the
+        initializer raised.
+        """
+        self.start()
+        if self._pool is None:
+            return {}
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        results: Dict[int, Any] = {}
+        try:
+            while len(results) < self.pool_size:
+                if loop.time() > deadline:
+                    raise RuntimeError(
+                        f"Only {len(results)} of {self.pool_size} DSL pool "
+                        f"processes started within {timeout}s")
+                # Each call holds its process briefly, so that the calls
+                # spread over the processes instead of the first one up
+                # taking them all
+                results.update(await asyncio.gather(*(
+                    loop.run_in_executor(self._pool,
+                                         functools.partial(_warm_up, fn))
+                    for _ in range(self.pool_size))))
+        except BrokenProcessPool as e:
+            self.shutdown()
+            raise RuntimeError(f"DSL process pool failed to start: {e}") from e
+        return results
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _saturated(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="DSL engine is busy. Please retry later.",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        if self._in_flight >= self.capacity:
+            raise self._saturated()
+        self.start()
+        loop = asyncio.get_event_loop()
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(self._pool,
+                                              functools.partial(fn, *args))
+        except BrokenProcessPool:
+            # A pool process died (e.g. OOM killed). Drop the pool so the
+            # next call starts a fresh one.
+            logger.warning("DSL process pool is broken, restarting it")
+            self.shutdown()
+            raise self._saturated()
+        finally:
+            self._in_flight -= 1
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from typing import Optional, Set
+
+from databases import Database
+from fastapi import HTTPException, status
+
+from app.core.config import CODEGEN_JOBS_HEARTBEAT, CODEGEN_JOBS_STALE_AFTER
+from app.db.repositories.job import CodegenJobRepository
+from app.models.job import CodegenJobStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+class CodegenJobRunner:
+    """
+    Runs codegen jobs in the background of the API worker that accepted
+    them, at most ``max_running`` at a time. Job state lives in the
+    codegen_jobs table, so any worker can answer status queries; the
+    result is kept in the artifact store under ``artifact_key``.
+
+    Submissions beyond ``max_pending`` queued or running jobs are rejected
+    with a 503. A job the DSL pool turns away as busy goes back to queued
+    and is retried up to ``max_retries`` times, with exponential backoff.
+
+    Unfinished jobs are touched every CODEGEN_JOBS_HEARTBEAT seconds; those
+    of a worker that died stop being touched and are marked failed by the
+    other workers, or on the next startup.
+    """
+
+    # Longest wait between two attempts of a job, in seconds
+    MAX_BACKOFF = 60
+
+    def __init__(self, dflow_service, *, max_running: int,
+                 max_pending: int, max_retries: int, retry_after: int) -> None:
+        self.dflow_service = dflow_service
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_after = retry_after
+        self._tasks: Set[asyncio.Task] = set()
+        self._job_ids: Set[int] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def check_capacity(self) -> None:
+        # A job's result is only kept in the artifact store, so without
+        # the store there would be nothing to download
+        if not self.dflow_service.artifacts.enabled:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Codegen jobs are disabled on this server. "
+                       "Use the synchronous codegen endpoints.",
+            )
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many codegen jobs. Please retry later.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+    def start(self, db: Database) -> None:
+        self._heartbeat = asyncio.get_event_loop().create_task(
+            self.run_heartbeat(db))
+
+    async def run_heartbeat(self, db: Database) -> None:
+        repo = CodegenJobRepository(db)
+        while True:
+            try:
+                if self._job_ids:
+                    await repo.touch_jobs(job_ids=list(self._job_ids))
+                reaped = await repo.fail_stale_jobs(
+                    stale_after=CODEGEN_JOBS_STALE_AFTER,
+                    error="Interrupted: the server running it stopped")
+                if reaped:
+                    logger.warning(f"Marked {reaped} stale codegen jobs failed")
+            except Exception as e:
+                logger.warning(f"Codegen job heartbeat failed: {e}")
+            await asyncio.sleep(CODEGEN_JOBS_HEARTBEAT)
+
+    def backoff(self, attempt: int) -> float:
+        return min(self.retry_after * 2 ** (attempt - 1), self.MAX_BACKOFF)
+
+    def submit(self, db: Database, job_id: int, model: bytes) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_running)
+        task = asyncio.get_event_loop().create_task(
+            self._run(db, job_id, model))
+        self._tasks.add(task)
+        self._job_ids.add(job_id)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._job_ids.discard(job_id))
+
+    async def _attempt(self, repo: CodegenJobRepository, job_id: int,
+                       model: bytes) -> None:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    await repo.set_job_status(job_id=job_id,
+                                              status=CodegenJobStatus.running)
+                    await self.dflow_service.codegen(model)
+                return
+            except HTTPException as e:
+                # 503: the DSL pool is busy, not a problem with the job
+                if e.status_code != status.HTTP_503_SERVICE_UNAVAILABLE \
+                        or attempt >= self.max_retries:
+                    raise
+            attempt += 1
+            await repo.set_job_status(job_id=job_id,
+                                      status=CodegenJobStatus.queued)
+            await asyncio.sleep(self.backoff(attempt))
+
+    async def _run(self, db: Database, job_id: int, model: bytes) -> None:
+        repo = CodegenJobRepository(db)
+        try:
+            await self._attempt(repo, job_id, model)
+        except asyncio.CancelledError:
+            await repo.set_job_status(job_id=job_id,
+                                      status=CodegenJobStatus.failed,
+                                      error="Interrupted by server shutdown")
+            raise
+        except HTTPException as e:
+            await repo.set_job_status(job_id=job_id,
+                                      status=CodegenJobStatus.failed,
+                                      error=str(e.detail))
+        except Exception as e:
+            await repo.set_job_status(job_id=job_id,
+                                      status=CodegenJobStatus.failed,
+                                      error=str(e))
+        else:
+            await repo.set_job_status(
+                job_id=job_id,
+                status=CodegenJobStatus.done,
+                artifact_key=self.dflow_service.artifacts.key(model))
+
+    async def shutdown(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
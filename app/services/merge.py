@@ -0,0 +1,194 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+SECTIONS = (
+    'entities',
+    'synonyms',
+    'gslots',
+    'triggers',
+    'dialogues',
+    'eservices',
+)
+
+# Order of the sections in a merged model
+MERGE_ORDER = (
+    'gslots',
+    'entities',
+    'synonyms',
+    'triggers',
+    'eservices',
+    'dialogues',
+)
+
+# Sections made of `<...> name ... end` blocks, with the position of the
+# name token within the block header
+BLOCK_SECTIONS = {
+    'entities': 0,
+    'synonyms': 0,
+    'eservices': 1,
+}
+
+# Sections made of comma separated `name: type` items
+LIST_SECTIONS = ('gslots',)
+
+TOKEN_RE = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<word>\w+)
+    | (?P<punct>.)
+""", re.VERBOSE | re.DOTALL)
+
+OPENING = '([{'
+CLOSING = ')]}'
+
+# (kind, value, start, end)
+Token = Tuple[str, str, int, int]
+# section -> [(item name or None, item text)]
+Contribution = Dict[str, List[Tuple[Optional[str], str]]]
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    Significant tokens of a model. Strings and comments are single tokens
+    (comments are dropped), so keywords inside them are never mistaken for
+    section boundaries.
+    """
+    return [(m.lastgroup, m.group(), m.start(), m.end())
+            for m in TOKEN_RE.finditer(text)
+            if m.lastgroup not in ('ws', 'comment')]
+
+
+def _is_end(token: Token) -> bool:
+    return token[0] == 'word' and token[1] == 'end'
+
+
+def split_sections(text: str,
+                   tokens: List[Token]) -> List[Tuple[str, List[Token]]]:
+    """
+    Single pass over the tokens; returns each section keyword with the
+    tokens of its body (without the closing `end`).
+
+    A section keyword only opens a section at top level: at the start of
+    the model or right after the `end` that closes the previous section,
+    and not as a `name: type` or list item. In BLOCK_SECTIONS, whose items
+    are `... end` blocks, an `end` outside an item closes the section, so
+    an item named after a section keyword stays an item.
+    """
+    sections = []
+    current = None
+    body_start = last_end = 0
+    prev = None
+    in_item = closed = False
+    for i, tok in enumerate(tokens):
+        if tok[0] == 'word' and tok[1] in SECTIONS:
+            nxt = tokens[i + 1][1] if i + 1 < len(tokens) else None
+            at_top = current is None or (
+                prev is not None and _is_end(prev) and
+                (closed or current not in BLOCK_SECTIONS))
+            if at_top and nxt not in (':', ','):
+                if current is not None:
+                    sections.append((current, tokens[body_start:last_end]))
+                current, body_start, last_end = tok[1], i + 1, None
+                in_item = closed = False
+                prev = tok
+                continue
+        if current is not None and _is_end(tok):
+            last_end = i
+            closed = not in_item
+            in_item = False
+        elif current is not None and not closed:
+            in_item = True
+        prev = tok
+    if current is not None and last_end is not None:
+        sections.append((current, tokens[body_start:last_end]))
+    return sections
+
+
+def _span(text: str, tokens: List[Token]) -> str:
+    return text[tokens[0][2]:tokens[-1][3]]
+
+
+def _block_items(text: str, tokens: List[Token], name_at: int):
+    items = []
+    start = 0
+    for i, tok in enumerate(tokens):
+        if _is_end(tok):
+            block = tokens[start:i + 1]
+            name = block[name_at][1] if len(block) > name_at + 1 and \
+                block[name_at][0] == 'word' else None
+            items.append((name, _span(text, block)))
+            start = i + 1
+    if start < len(tokens):
+        items.append((None, _span(text, tokens[start:])))
+    return items
+
+
+def _list_items(text: str, tokens: List[Token]):
+    items = []
+    start = 0
+    depth = 0
+    for i, tok in enumerate(tokens + [('punct', ',', -1, -1)]):
+        if tok[0] != 'punct':
+            continue
+        if tok[1] in OPENING:
+            depth += 1
+        elif tok[1] in CLOSING:
+            depth -= 1
+        elif tok[1] == ',' and depth == 0:
+            item = tokens[start:i]
+            if item:
+                name = item[0][1] if item[0][0] == 'word' else None
+                items.append((name, _span(text, item)))
+            start = i + 1
+    return items
+
+
+def extract_sections(text: str) -> Contribution:
+    """
+    What a single model contributes to a merged model: the items of each
+    of its sections, named where the section has named items.
+    """
+    contribution: Contribution = {}
+    for section, body in split_sections(text, tokenize(text)):
+        if not body:
+            continue
+        if section in BLOCK_SECTIONS:
+            items = _block_items(text, body, BLOCK_SECTIONS[section])
+        elif section in LIST_SECTIONS:
+            items = _list_items(text, body)
+        else:
+            items = [(None, _span(text, body))]
+        contribution.setdefault(section, []).extend(items)
+    return contribution
+
+
+def merge_contributions(contributions: Iterable[Contribution]) -> str:
+    """
+    Join contributions into one model. Named items (entities, synonyms,
+    gslots, eservices) are kept once, first occurrence wins; empty
+    sections are left out.
+    """
+    merged = {section: [] for section in SECTIONS}
+    seen = {section: set() for section in SECTIONS}
+    for contribution in contributions:
+        for section, items in contribution.items():
+            for name, item in items:
+                if name is not None:
+                    if name in seen[section]:
+                        continue
+                    seen[section].add(name)
+                merged[section].append(item)
+
+    parts = []
+    for section in MERGE_ORDER:
+        if not merged[section]:
+            continue
+        sep = ',\n    ' if section in LIST_SECTIONS else '\n    '
+        parts.append(f'{section}\n    {sep.join(merged[section])}\nend')
+    return '\n\n'.join(parts) + '\n'
+
+
+def merge_models(models: Iterable[str]) -> str:
+    return merge_contributions(extract_sections(m) for m in models)
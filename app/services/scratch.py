@@ -0,0 +1,135 @@
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+def _entry_usage(path: str) -> Tuple[int, int]:
+    """Bytes and number of files held by a file or directory tree."""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size, 1
+    nbytes = nfiles = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                nbytes += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                continue
+            nfiles += 1
+    return nbytes, nfiles
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ScratchSpace:
+    """
+    Lifecycle of the scratch files the DSL engine writes.
+
+    Every request gets its own working directory under ``root``, which the
+    route releases once the response is sent. A periodic sweep (the
+    janitor) removes whatever was left behind: entries older than
+    ``max_age`` seconds, then the oldest entries until the total is below
+    ``max_bytes``. Entries younger than ``grace`` seconds are never evicted
+    for quota, since a request may still be using them.
+    """
+
+    def __init__(self,
+                 *,
+                 root: str,
+                 max_age: int,
+                 max_bytes: int,
+                 grace: int = 60) -> None:
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.held_bytes = 0
+        self.held_files = 0
+        self.evicted_bytes = 0
+        self.evicted_files = 0
+        self.last_sweep = 0.0
+
+    def workdir(self, prefix: str = 'req') -> str:
+        path = os.path.join(self.root, f'{prefix}-{uuid.uuid4().hex[0:8]}')
+        os.makedirs(path)
+        return path
+
+    def _top_level(self, path: str):
+        """The entry directly under root that holds ``path``, if any."""
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(path)
+        if os.path.commonpath([root, path]) != root or path == root:
+            return None
+        rel = os.path.relpath(path, root)
+        return os.path.join(root, rel.split(os.sep)[0])
+
+    def release(self, path: str) -> None:
+        """
+        Remove the working directory (or loose file) that holds ``path``.
+        Paths outside the scratch space, e.g. artifacts served from the
+        store, are left alone.
+        """
+        entry = self._top_level(path)
+        if entry is not None:
+            _remove(entry)
+
+    def scan(self) -> List[Tuple[float, int, int, str]]:
+        entries = []
+        try:
+            it = os.scandir(self.root)
+        except FileNotFoundError:
+            return entries
+        with it:
+            for entry in it:
+                try:
+                    mtime = entry.stat(follow_symlinks=False).st_mtime
+                    nbytes, nfiles = _entry_usage(entry.path)
+                except FileNotFoundError:
+                    continue
+                entries.append((mtime, nbytes, nfiles, entry.path))
+        entries.sort()
+        return entries
+
+    def sweep(self) -> Dict[str, int]:
+        now = time.time()
+        entries = self.scan()
+        total = sum(e[1] for e in entries)
+        kept_bytes = kept_files = 0
+        for mtime, nbytes, nfiles, path in entries:
+            age = now - mtime
+            expired = age > self.max_age
+            over_quota = total > self.max_bytes and age > self.grace
+            if expired or over_quota:
+                _remove(path)
+                total -= nbytes
+                self.evicted_bytes += nbytes
+                self.evicted_files += nfiles
+            else:
+                kept_bytes += nbytes
+                kept_files += nfiles
+        self.held_bytes = kept_bytes
+        self.held_files = kept_files
+        self.last_sweep = now
+        return self.stats()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'held_bytes': self.held_bytes,
+            'held_files': self.held_files,
+            'evicted_bytes': self.evicted_bytes,
+            'evicted_files': self.evicted_files,
+            'last_sweep': int(self.last_sweep),
+        }
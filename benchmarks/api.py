@@ -0,0 +1,241 @@
+"""
+End-to-end API benchmark.
+
+Runs the application in-process, through an ASGI client with the startup
+and shutdown handlers driven by asgi-lifespan, against the Postgres test
+database (TESTING=1 makes the app use ``<POSTGRES_DB>_test``). The
+repositories use Postgres-only SQL, so there is no SQLite mode. Create the
+database first with::
+
+    TESTING=1 alembic upgrade head
+
+then, for example::
+
+    python -m benchmarks.api --concurrency 8 --requests 200 -o base.json
+    python -m benchmarks.api --concurrency 8 --requests 200 -o new.json \\
+        --baseline base.json
+
+The run exits with status 1 when a metric regressed by more than
+--threshold against the baseline.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+os.environ.setdefault("TESTING", "1")
+
+from asgi_lifespan import LifespanManager  # noqa: E402
+from httpx import AsyncClient  # noqa: E402
+
+from benchmarks.corpus import generate_model, scaled_sizes  # noqa: E402
+from benchmarks.stats import (  # noqa: E402
+    compare,
+    load_results,
+    run_meta,
+    save_results,
+    summarize,
+)
+
+
+SCENARIOS = ("login", "validation", "codegen", "store_model", "get_model", "merge")
+
+
+PASSWORD = "benchmark-password"
+
+
+class Bench:
+    def __init__(self, client: AsyncClient, app, args) -> None:
+        self.client = client
+        self.app = app
+        self.args = args
+        self.model = generate_model(0, **scaled_sizes(args.model_scale)).encode("utf8")
+        self.users: List[str] = []
+        self.tokens: Dict[str, str] = {}
+        self.model_ids: List[int] = []
+
+    def auth(self, username: str = None) -> Dict[str, str]:
+        username = username or random.choice(self.users)
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    def model_body(self, i: int) -> bytes:
+        # A unique trailing comment defeats the content-addressed caches
+        if self.args.cold:
+            return self.model + f"\n// benchmark {uuid.uuid4().hex} {i}\n".encode()
+        return self.model
+
+    def check(self, res, *expected: int) -> None:
+        if res.status_code not in expected:
+            raise RuntimeError(f"{res.request.method} {res.request.url} -> "
+                               f"{res.status_code}: {res.text[0:200]}")
+
+    async def setup(self) -> None:
+        run = uuid.uuid4().hex[0:6]
+        for i in range(self.args.users):
+            username = f"bench{run}_{i}"
+            res = await self.client.post(
+                self.app.url_path_for("user:register-new-user"),
+                json={"new_user": {"email": f"{username}@bench.example.com",
+                                   "username": username,
+                                   "password": PASSWORD}})
+            self.check(res, 201)
+            self.users.append(username)
+            self.tokens[username] = await self.login(username)
+            for j in range(self.args.models_per_user):
+                await self.store_model(j, username)
+        for username in self.users:
+            res = await self.client.get(
+                self.app.url_path_for("model:list_models_for_user", username=username),
+                params={"limit": 500}, headers=self.auth(username))
+            self.check(res, 200)
+            self.model_ids.extend(item["id"] for item in res.json()["items"])
+
+    async def login(self, username: str) -> str:
+        res = await self.client.post(
+            self.app.url_path_for("user:login"),
+            data={"username": username, "password": PASSWORD})
+        self.check(res, 200)
+        return res.json()["access_token"]
+
+    async def store_model(self, i: int, username: str = None) -> None:
+        res = await self.client.post(
+            self.app.url_path_for("model:store_model_b64"),
+            content=self.model_body(i),
+            headers={"Content-Type": "text/plain", **self.auth(username)})
+        self.check(res, 200)
+
+    def scenario(self, name: str) -> Callable[[int], Awaitable[None]]:
+        async def login(i: int) -> None:
+            await self.login(self.users[i % len(self.users)])
+
+        async def validation(i: int) -> None:
+            res = await self.client.post(
+                self.app.url_path_for("validation:validate_model_b64"),
+                content=self.model_body(i),
+                headers={"Content-Type": "text/plain", **self.auth()})
+            self.check(res, 200)
+
+        async def codegen(i: int) -> None:
+            res = await self.client.post(
+                self.app.url_path_for("codegen:gen_model_b64"),
+                content=self.model_body(i),
+                headers={"Content-Type": "text/plain", **self.auth()})
+            self.check(res, 200)
+
+        async def get_model(i: int) -> None:
+            res = await self.client.get(
+                self.app.url_path_for("model:get_model_by_id",
+                                      model_id=str(random.choice(self.model_ids))),
+                headers=self.auth())
+            self.check(res, 200)
+
+        async def merge(i: int) -> None:
+            res = await self.client.get(
+                self.app.url_path_for("model:merge_models"), headers=self.auth())
+            self.check(res, 200)
+
+        return {
+            "login": login,
+            "validation": validation,
+            "codegen": codegen,
+            "store_model": self.store_model,
+            "get_model": get_model,
+            "merge": merge,
+        }[name]
+
+
+async def run_scenario(request: Callable[[int], Awaitable[None]],
+                       total: int,
+                       concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"  first error: {e}", file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def main(args) -> Dict:
+    from app.api.server import get_application
+
+    app = get_application()
+    results = {
+        "meta": run_meta(concurrency=args.concurrency,
+                         requests=args.requests,
+                         users=args.users,
+                         models_per_user=args.models_per_user,
+                         model_scale=args.model_scale,
+                         cold=args.cold),
+        "scenarios": {},
+    }
+    async with LifespanManager(app):
+        async with AsyncClient(app=app, base_url="http://benchmark",
+                               timeout=None) as client:
+            bench = Bench(client, app, args)
+            await bench.setup()
+            results["meta"]["model_bytes"] = len(bench.model)
+            for name in args.scenarios:
+                request = bench.scenario(name)
+                for i in range(args.warmup):
+                    await request(i)
+                summary = await run_scenario(request, args.requests,
+                                             args.concurrency)
+                results["scenarios"][name] = summary
+                print(f"{name:<16} {summary['throughput_rps']:>9} req/s  "
+                      f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+                      f"p99 {summary['p99_ms']} ms  errors {summary['errors']}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, default=200,
+                        help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="untimed requests before each scenario")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--models-per-user", type=int, default=5)
+    parser.add_argument("--model-scale", type=float, default=1.0,
+                        help="scale of the benchmark model's sections, "
+                             "relative to benchmarks.corpus.DEFAULT_SIZES")
+    parser.add_argument("--cold", action="store_true",
+                        help="make every model unique, bypassing the caches")
+    parser.add_argument("-s", "--scenarios", nargs="+", choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change that counts as a regression")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+    if args.output:
+        save_results(args.output, results)
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline),
+                              args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
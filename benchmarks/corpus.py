@@ -0,0 +1,156 @@
+"""
+Synthetic dflow models.
+
+generate_model() writes a model with the requested number of items in
+each section. Triggers use the entities and synonyms, and dialogues are
+started by the triggers, so larger models also exercise reference
+resolution. The output is deterministic for a given seed.
+
+    python -m benchmarks.corpus --entities 200 --dialogues 50 -o big.dflow
+    python -m benchmarks.corpus --count 20 --out-dir corpus/
+"""
+import argparse
+import os
+import random
+from typing import Dict, List
+
+# Section sizes of a small but complete model
+DEFAULT_SIZES = {
+    "gslots": 4,
+    "entities": 8,
+    "synonyms": 4,
+    "triggers": 8,
+    "eservices": 2,
+    "dialogues": 4,
+}
+
+WORDS = (
+    "weather", "city", "robot", "kitchen", "light", "music", "door", "alarm",
+    "battery", "meeting", "coffee", "station", "garden", "window", "printer",
+    "camera", "schedule", "office", "parcel", "elevator", "lamp", "screen",
+)
+
+
+class ModelGenerator:
+    def __init__(self, seed: int = 0, values_per_item: int = 4) -> None:
+        self.rnd = random.Random(seed)
+        self.values_per_item = values_per_item
+
+    def phrase(self, words: int = 3) -> str:
+        return " ".join(self.rnd.choice(WORDS) for _ in range(words))
+
+    def values(self) -> str:
+        return ", ".join(f"'{self.phrase(2)}'"
+                         for _ in range(self.values_per_item))
+
+    def gslots(self, n: int) -> List[str]:
+        slots = [f"    slot_{i}: {self.rnd.choice(('str', 'int', 'float'))}"
+                 for i in range(n)]
+        return ["gslots", ",\n".join(slots), "end"] if slots else []
+
+    def entities(self, n: int) -> List[str]:
+        lines = ["entities"]
+        for i in range(n):
+            lines += [f"    entity_{i}", f"        {self.values()}", "    end"]
+        return lines + ["end"] if n else []
+
+    def synonyms(self, n: int) -> List[str]:
+        lines = ["synonyms"]
+        for i in range(n):
+            lines += [f"    synonym_{i}", f"        {self.values()}", "    end"]
+        return lines + ["end"] if n else []
+
+    def triggers(self, n: int, entities: int, synonyms: int) -> List[str]:
+        lines = ["triggers"]
+        for i in range(n):
+            parts = [f"'{self.phrase()}'"]
+            if entities:
+                parts.append(f"PE:entity_{self.rnd.randrange(entities)}")
+            if synonyms:
+                parts.append(f"S:synonym_{self.rnd.randrange(synonyms)}")
+            lines += [f"    Intent intent_{i}",
+                      f"        {', '.join(parts)}",
+                      f"        '{self.phrase()}'",
+                      "    end"]
+        return lines + ["end"] if n else []
+
+    def eservices(self, n: int) -> List[str]:
+        lines = ["eservices"]
+        for i in range(n):
+            lines += [f"    EServiceHTTP service_{i}",
+                      f"        verb: {self.rnd.choice(('GET', 'POST'))}",
+                      "        host: 'localhost'",
+                      f"        port: {8000 + i}",
+                      f"        path: '/{self.rnd.choice(WORDS)}/{i}'",
+                      "    end"]
+        return lines + ["end"] if n else []
+
+    def dialogues(self, n: int, triggers: int) -> List[str]:
+        if not triggers:
+            return []
+        lines = ["dialogues"]
+        for i in range(n):
+            lines += [f"    Dialogue dialogue_{i}",
+                      f"        on: intent_{self.rnd.randrange(triggers)}",
+                      "        responses:",
+                      f"            ActionGroup answer_{i}",
+                      f"                Speak('{self.phrase(5)}')",
+                      "            end",
+                      "        end",
+                      "    end"]
+        return lines + ["end"] if n else []
+
+    def model(self, sizes: Dict[str, int]) -> str:
+        s = {**DEFAULT_SIZES, **sizes}
+        blocks = [
+            self.gslots(s["gslots"]),
+            self.entities(s["entities"]),
+            self.synonyms(s["synonyms"]),
+            self.triggers(s["triggers"], s["entities"], s["synonyms"]),
+            self.eservices(s["eservices"]),
+            self.dialogues(s["dialogues"], s["triggers"]),
+        ]
+        return "\n\n".join("\n".join(b) for b in blocks if b) + "\n"
+
+
+def generate_model(seed: int = 0, **sizes: int) -> str:
+    """A model with DEFAULT_SIZES, overridden by ``sizes`` per section"""
+    unknown = set(sizes) - set(DEFAULT_SIZES)
+    if unknown:
+        raise ValueError(f"Unknown sections: {', '.join(sorted(unknown))}")
+    return ModelGenerator(seed).model(sizes)
+
+
+def scaled_sizes(scale: float) -> Dict[str, int]:
+    return {k: max(int(v * scale), 1) for k, v in DEFAULT_SIZES.items()}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic dflow models")
+    for section, size in DEFAULT_SIZES.items():
+        parser.add_argument(f"--{section}", type=int, default=size)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--count", type=int, default=1,
+                        help="models to write, with consecutive seeds")
+    parser.add_argument("-o", "--output", help="file, for a single model")
+    parser.add_argument("--out-dir", help="directory, for --count models")
+    args = parser.parse_args(argv)
+
+    sizes = {section: getattr(args, section) for section in DEFAULT_SIZES}
+    if args.count == 1 and not args.out_dir:
+        model = generate_model(args.seed, **sizes)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(model)
+        else:
+            print(model, end="")
+        return
+    out_dir = args.out_dir or "."
+    os.makedirs(out_dir, exist_ok=True)
+    for i in range(args.count):
+        with open(os.path.join(out_dir, f"model-{args.seed + i}.dflow"), "w") as f:
+            f.write(generate_model(args.seed + i, **sizes))
+
+
+if __name__ == "__main__":
+    main()
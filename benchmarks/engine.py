@@ -0,0 +1,173 @@
+"""
+Scaling curves for the DSL engine.
+
+For each model dimension (entities, synonyms, gslots, triggers, eservices,
+dialogues) the benchmark grows that section while the others stay at
+their defaults, and records the time and, in a separate run, the peak
+Python memory (tracemalloc) of each stage:
+
+    parse      DflowService.parse_model, i.e. build_model without the file
+    generate   DflowService.generate_tree, the dflow code generator
+    tarball    DflowService.make_tarball over the generated tree
+    merge      merge_models over --merge-models models of that size
+
+Stages run in this process, not through the DSL pool. The local log-log
+slope between consecutive sizes is reported per stage; a slope above
+--superlinear (default 1.2) is flagged.
+
+    python -m benchmarks.engine --sizes 10 100 1000 -o engine.json
+    python -m benchmarks.engine -d entities dialogues --stages parse merge
+"""
+import argparse
+import math
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.corpus import DEFAULT_SIZES, generate_model
+from benchmarks.stats import run_meta, save_results
+
+
+STAGES = ("parse", "generate", "tarball", "merge")
+
+
+def measure(fn: Callable[[], None], repeat: int) -> Dict:
+    """
+    Median time over ``repeat`` untraced runs, then the peak traced memory
+    of one more run; tracemalloc slows allocations down too much to time
+    under it.
+    """
+    times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "time_ms": round(1000 * statistics.median(times), 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+class EngineStages:
+    def __init__(self, merge_models_count: int) -> None:
+        from app.services import dflow_service
+
+        self.service = dflow_service
+        # Keep the one-off metamodel build out of the first parse
+        self.service.load_metamodel()
+        self.merge_models_count = merge_models_count
+
+    def parse(self, model: str) -> Callable[[], None]:
+        return lambda: self.service.parse_model(model)
+
+    def generate(self, model: str) -> Callable[[], None]:
+        def run() -> None:
+            workdir, _ = self.service.generate_tree(model.encode("utf8"))
+            self.service.scratch.release(workdir)
+        return run
+
+    def tarball(self, model: str) -> Tuple[Callable[[], None], Callable[[], None]]:
+        workdir, out_dir = self.service.generate_tree(model.encode("utf8"))
+        fd, tarball_path = tempfile.mkstemp(suffix=".tar.gz")
+        os.close(fd)
+
+        def cleanup() -> None:
+            os.remove(tarball_path)
+            self.service.scratch.release(workdir)
+        return lambda: self.service.make_tarball(tarball_path, out_dir), cleanup
+
+    def merge(self, sizes: Dict[str, int]) -> Callable[[], None]:
+        from app.services.merge import merge_models
+
+        models = [generate_model(seed, **sizes)
+                  for seed in range(self.merge_models_count)]
+        return lambda: merge_models(models)
+
+    def run(self, stage: str, sizes: Dict[str, int], repeat: int) -> Dict:
+        model = generate_model(0, **sizes)
+        cleanup: Optional[Callable[[], None]] = None
+        try:
+            if stage == "merge":
+                fn = self.merge(sizes)
+            elif stage == "tarball":
+                fn, cleanup = self.tarball(model)
+            else:
+                fn = getattr(self, stage)(model)
+            return measure(fn, repeat)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+
+def slopes(points: List[Dict], key: str) -> List[Optional[float]]:
+    """log-log slope between consecutive (size, key) points"""
+    result: List[Optional[float]] = []
+    for a, b in zip(points, points[1:]):
+        if a.get(key) and b.get(key) and b["size"] > a["size"]:
+            result.append(round(math.log(b[key] / a[key]) /
+                                math.log(b["size"] / a["size"]), 2))
+        else:
+            result.append(None)
+    return result
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="DSL engine scaling curves")
+    parser.add_argument("-d", "--dimensions", nargs="+",
+                        choices=list(DEFAULT_SIZES), default=list(DEFAULT_SIZES))
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        default=[10, 50, 100, 500, 1000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES,
+                        default=list(STAGES))
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--merge-models", type=int, default=10,
+                        help="models merged together in the merge stage")
+    parser.add_argument("--superlinear", type=float, default=1.2)
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    stages = EngineStages(args.merge_models)
+    results = {
+        "meta": run_meta(dimensions=args.dimensions, sizes=args.sizes,
+                         stages=args.stages, repeat=args.repeat,
+                         merge_models=args.merge_models),
+        "curves": {},
+        "superlinear": [],
+    }
+    for dimension in args.dimensions:
+        for stage in args.stages:
+            points = []
+            for size in sorted(args.sizes):
+                point = {"size": size,
+                         **stages.run(stage, {dimension: size}, args.repeat)}
+                points.append(point)
+                print(f"{dimension:<10} {stage:<9} {size:>7}  "
+                      + (point.get("error") or
+                         f"{point['time_ms']:>10} ms {point['peak_kib']:>10} KiB"))
+            time_slopes = slopes(points, "time_ms")
+            results["curves"].setdefault(dimension, {})[stage] = {
+                "points": points,
+                "time_slopes": time_slopes,
+                "memory_slopes": slopes(points, "peak_kib"),
+            }
+            if any(s is not None and s > args.superlinear for s in time_slopes):
+                results["superlinear"].append(f"{dimension}/{stage}")
+                print(f"{dimension:<10} {stage:<9} superlinear: {time_slopes}")
+
+    if args.output:
+        save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import json
+import math
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], duration: float, errors: int = 0) -> Dict:
+    """Throughput and latency percentiles, in ms, of one scenario"""
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "duration_s": round(duration, 4),
+        "throughput_rps": round(count / duration, 2) if duration else 0.0,
+        "mean_ms": round(1000 * sum(values) / count, 3) if count else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+        "max_ms": round(1000 * values[-1], 3) if count else 0.0,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta(**params) -> Dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params,
+    }
+
+
+def save_results(path: str, results: Dict) -> None:
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+# (metric, True when higher is better)
+COMPARED_METRICS = (
+    ("throughput_rps", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+)
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Print each scenario against the baseline and return the regressions,
+    i.e. metrics that got worse by more than ``threshold`` (0.1 = 10%).
+    """
+    regressions = []
+    for name, current in sorted(results["scenarios"].items()):
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            print(f"{name:<16} (not in baseline)")
+            continue
+        cells = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            mark = ""
+            if worse > threshold:
+                mark = " !"
+                regressions.append(f"{name} {metric}: {old} -> {new}")
+            cells.append(f"{metric} {old} -> {new} ({change:+.1%}){mark}")
+        print(f"{name:<16} " + ", ".join(cells))
+    return regressions
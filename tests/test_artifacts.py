@@ -0,0 +1,44 @@
+import os
+import tarfile
+
+from app.services.artifacts import ArtifactStore, make_reproducible_tarball
+
+
+def _write_tree(root) -> None:
+    (root / "src" / "nested").mkdir(parents=True)
+    (root / "src" / "b.txt").write_text("b")
+    (root / "src" / "nested" / "a.py").write_text("a")
+
+
+class TestReproducibleTarball:
+    def test_identical_trees_give_identical_bytes(self, tmp_path) -> None:
+        _write_tree(tmp_path)
+        src = str(tmp_path / "src")
+        make_reproducible_tarball(str(tmp_path / "1.tar.gz"), src, "gen")
+        os.utime(tmp_path / "src" / "b.txt", (0, 123456))
+        make_reproducible_tarball(str(tmp_path / "2.tar.gz"), src, "gen")
+        assert (tmp_path / "1.tar.gz").read_bytes() == \
+            (tmp_path / "2.tar.gz").read_bytes()
+
+    def test_stable_member_order(self, tmp_path) -> None:
+        _write_tree(tmp_path)
+        out = str(tmp_path / "out.tar.gz")
+        make_reproducible_tarball(out, str(tmp_path / "src"), "gen")
+        with tarfile.open(out) as tar:
+            assert tar.getnames() == [
+                "gen", "gen/b.txt", "gen/nested", "gen/nested/a.py"
+            ]
+
+
+class TestArtifactStore:
+    def test_size_cap_evicts_least_recently_used(self, tmp_path) -> None:
+        store = ArtifactStore(root=str(tmp_path), max_bytes=250)
+        for i, key in enumerate(["a", "b", "c"]):
+            tmp = store.tmp_path(key)
+            with open(tmp, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(tmp, (i, i))
+            store.put(key, tmp)
+        assert store.get("a") is None
+        assert store.get("b") is not None
+        assert store.get("c") is not None
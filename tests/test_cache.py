@@ -0,0 +1,33 @@
+from app.services.cache import ValidationCache
+
+
+class TestValidationCache:
+    def test_hit_after_put(self, tmp_path) -> None:
+        cache = ValidationCache(path=str(tmp_path / "v.sqlite"),
+                                max_entries=10, ttl=60)
+        key = cache.key(b"entities\nend")
+        assert cache.get(key) is None
+        cache.put(key, False, "Expected ID at position (1, 1)")
+        assert cache.get(key) == (False, "Expected ID at position (1, 1)")
+
+    def test_key_depends_on_content(self, tmp_path) -> None:
+        cache = ValidationCache(path=str(tmp_path / "v.sqlite"),
+                                max_entries=10, ttl=60)
+        assert cache.key(b"a") == cache.key(b"a")
+        assert cache.key(b"a") != cache.key(b"b")
+
+    def test_lru_eviction(self, tmp_path) -> None:
+        cache = ValidationCache(path=str(tmp_path / "v.sqlite"),
+                                max_entries=2, ttl=60)
+        keys = [cache.key(bytes([i])) for i in range(3)]
+        for key in keys:
+            cache.put(key, True)
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[2]) == (True, "")
+
+    def test_ttl_expiry(self, tmp_path) -> None:
+        cache = ValidationCache(path=str(tmp_path / "v.sqlite"),
+                                max_entries=10, ttl=-1)
+        key = cache.key(b"a")
+        cache.put(key, True)
+        assert cache.get(key) is None
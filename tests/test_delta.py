@@ -0,0 +1,29 @@
+from app.services.delta import apply_delta, decode_delta, encode_delta, make_delta
+
+
+BASE = "".join(f"entity E{i}\n    name: str\nend\n" for i in range(100))
+
+
+class TestDelta:
+    def roundtrip(self, base, target):
+        delta = decode_delta(encode_delta(make_delta(base, target)))
+        return apply_delta(base, delta)
+
+    def test_roundtrip(self):
+        edited = BASE.replace("entity E50\n", "entity Changed\n")
+        edited = edited + "entity Last\nend"
+        assert self.roundtrip(BASE, edited) == edited
+        assert self.roundtrip(BASE, "") == ""
+        assert self.roundtrip("", BASE) == BASE
+        assert self.roundtrip(BASE, BASE) == BASE
+
+    def test_small_edit_gives_small_delta(self):
+        edited = BASE.replace("entity E50\n", "entity Changed\n")
+        delta = encode_delta(make_delta(BASE, edited))
+        assert len(delta) < 100
+
+    def test_bounds(self):
+        assert make_delta(BASE, BASE + "end\n", max_lines=100) is None
+        unrelated = "".join(f"slot S{i}: int\n" for i in range(300))
+        assert make_delta(BASE, unrelated, min_ratio=0.5) is None
+        assert make_delta(BASE, BASE, max_lines=300, min_ratio=0.5) == [[0, 300]]
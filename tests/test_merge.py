@@ -0,0 +1,70 @@
+from app.services.merge import extract_sections, merge_models
+
+
+MODEL_A = """
+gslots
+    name: str,
+    entities_count: int
+end
+
+entities
+    PERSON
+        "john", "end of entities"
+    end
+end
+
+triggers
+    Intent greet
+        "hello"
+    end
+end
+"""
+
+MODEL_B = """
+entities
+    PERSON
+        "jane"
+    end
+    CITY
+        "athens"
+    end
+end
+
+gslots
+    name: str, age: int
+end
+"""
+
+
+class TestMerge:
+    def test_keywords_in_strings_and_names_are_not_sections(self) -> None:
+        sections = extract_sections(MODEL_A)
+        assert [name for name, _ in sections["gslots"]] == \
+            ["name", "entities_count"]
+        assert [name for name, _ in sections["entities"]] == ["PERSON"]
+        assert '"end of entities"' in sections["entities"][0][1]
+
+    def test_named_items_are_deduplicated(self) -> None:
+        merged = merge_models([MODEL_A, MODEL_B])
+        assert merged.count("PERSON") == 1
+        assert '"john"' in merged and '"jane"' not in merged
+        assert "CITY" in merged
+        assert merged.count("name: str") == 1
+
+    def test_list_items_are_comma_separated(self) -> None:
+        merged = merge_models([MODEL_A, MODEL_B])
+        assert "gslots\n    name: str,\n    entities_count: int,\n" \
+            "    age: int\nend" in merged
+
+    def test_empty_sections_are_left_out(self) -> None:
+        merged = merge_models([MODEL_B])
+        assert "triggers" not in merged
+        assert merged.startswith("gslots")
+
+    def test_items_named_after_sections_stay_items(self) -> None:
+        sections = extract_sections(
+            'entities\n    PERSON "a" end\n    synonyms "x" end\nend\n'
+            'synonyms\n    big "large" end\nend\n')
+        assert [name for name, _ in sections["entities"]] == \
+            ["PERSON", "synonyms"]
+        assert [name for name, _ in sections["synonyms"]] == ["big"]
@@ -0,0 +1,40 @@
+import os
+import time
+
+from app.services.scratch import ScratchSpace
+
+
+class TestScratchSpace:
+    def test_release_removes_whole_workdir(self, tmp_path) -> None:
+        scratch = ScratchSpace(root=str(tmp_path), max_age=60, max_bytes=1024)
+        workdir = scratch.workdir()
+        open(os.path.join(workdir, "model.dflow"), "w").close()
+        scratch.release(os.path.join(workdir, "model.dflow"))
+        assert os.listdir(tmp_path) == []
+
+    def test_release_ignores_paths_outside_root(self, tmp_path) -> None:
+        outside = tmp_path / "artifact.tar.gz"
+        outside.write_bytes(b"x")
+        scratch = ScratchSpace(root=str(tmp_path / "scratch"),
+                               max_age=60, max_bytes=1024)
+        scratch.release(str(outside))
+        assert outside.exists()
+
+    def test_sweep_evicts_by_age_then_quota(self, tmp_path) -> None:
+        scratch = ScratchSpace(root=str(tmp_path), max_age=100,
+                               max_bytes=150, grace=0)
+        now = time.time()
+        expired, oldest, newest = (scratch.workdir() for _ in range(3))
+        for path, size, age in ((expired, 10, 500),
+                                (oldest, 100, 50),
+                                (newest, 100, 0)):
+            with open(os.path.join(path, "f"), "wb") as f:
+                f.write(b"x" * size)
+            os.utime(path, (now - age, now - age))
+
+        stats = scratch.sweep()
+
+        assert os.listdir(tmp_path) == [os.path.basename(newest)]
+        assert stats["held_bytes"] == 100
+        assert stats["held_files"] == 1
+        assert stats["evicted_bytes"] == 110